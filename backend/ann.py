@@ -0,0 +1,124 @@
+"""Approximate nearest-neighbor search over movie embeddings (IVF, pure NumPy).
+
+Embeddings are clustered with spherical k-means into `n_lists` inverted lists.
+A query scores the centroids, then only the movies in the `n_probe` closest
+lists, so the cost per request is O(n_lists * d + N * n_probe / n_lists * d)
+instead of O(N * d). More probes give higher recall at higher latency.
+"""
+
+import time
+
+import numpy as np
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _assign(vectors_fn, n, centroids, chunk_rows=65536):
+    """Nearest centroid of every row, computed chunk by chunk"""
+    assignment = np.empty(n, dtype=np.int32)
+    for start in range(0, n, chunk_rows):
+        stop = min(start + chunk_rows, n)
+        assignment[start:stop] = np.argmax(vectors_fn(np.arange(start, stop)) @ centroids.T, axis=1)
+    return assignment
+
+
+class IVFIndex:
+    """Inverted-file index: items of list j are items[indptr[j]:indptr[j + 1]]"""
+
+    def __init__(self, centroids, indptr, items):
+        self.centroids = centroids
+        self.indptr = indptr
+        self.items = items
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    @property
+    def nbytes(self):
+        return int(self.centroids.nbytes + self.indptr.nbytes + self.items.nbytes)
+
+    @classmethod
+    def build(cls, model, n_lists, iterations=15, sample_size=100000, seed=0):
+        """Cluster the embeddings of `model` into `n_lists` inverted lists"""
+        n = model.n_items
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+
+        sample_rows = np.sort(rng.choice(n, size=min(n, max(sample_size, n_lists)), replace=False))
+        sample = _normalize(model.vectors(sample_rows))
+        centroids = sample[rng.choice(sample.shape[0], size=n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            # Re-seed empty lists with random sample points
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            centroids = _normalize(sums).astype(np.float32)
+
+        assignment = _assign(model.vectors, n, centroids)
+        items = np.argsort(assignment, kind="stable").astype(np.int32)
+        indptr = np.zeros(n_lists + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+        return cls(centroids, indptr, items)
+
+    def candidates(self, vector, n_probe):
+        """Items in the `n_probe` lists whose centroids score highest for `vector`"""
+        centroid_scores = np.asarray(self.centroids, dtype=np.float32) @ vector
+        n_probe = max(1, min(n_probe, self.n_lists))
+        lists = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        return np.concatenate([np.asarray(self.items[self.indptr[j]:self.indptr[j + 1]], dtype=np.intp)
+                               for j in lists])
+
+    def extended(self, vectors):
+        """Copy of the index with `vectors` appended as items n, n+1, ..."""
+        n = self.items.shape[0]
+        lists = np.repeat(np.arange(self.n_lists, dtype=np.int32), np.diff(self.indptr))
+        assignment = np.empty(n + vectors.shape[0], dtype=np.int32)
+        assignment[self.items] = lists
+        assignment[n:] = np.argmax(vectors @ np.asarray(self.centroids, dtype=np.float32).T, axis=1)
+        items = np.argsort(assignment, kind="stable").astype(np.int32)
+        indptr = np.zeros(self.n_lists + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(assignment, minlength=self.n_lists))
+        return IVFIndex(self.centroids, indptr, items)
+
+    def to_arrays(self):
+        return {"ann_centroids": self.centroids, "ann_indptr": self.indptr, "ann_items": self.items}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        if "ann_centroids" not in arrays:
+            return None
+        return cls(arrays["ann_centroids"], arrays["ann_indptr"], arrays["ann_items"])
+
+
+def benchmark_recall(model, k=10, n_queries=200, n_probes=(1, 2, 4, 8, 16), seed=0):
+    """Recall@k and mean latency of ANN search against exact search.
+
+    Returns one dict per n_probe value, plus a row for exact search.
+    """
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(model.n_items, size=min(n_queries, model.n_items), replace=False)
+
+    def run(search):
+        results = []
+        started = time.perf_counter()
+        for idx in queries:
+            results.append(search(idx))
+        return results, (time.perf_counter() - started) / len(queries) * 1000
+
+    exact, exact_ms = run(lambda idx: model.exact_neighbors(idx, k)[0])
+    report = [{"n_probe": None, "recall": 1.0, "latency_ms": exact_ms}]
+
+    for n_probe in n_probes:
+        approx, approx_ms = run(lambda idx: model.ann_neighbors(idx, k, n_probe=n_probe)[0])
+        hits = [len(np.intersect1d(a, e)) / max(len(e), 1) for a, e in zip(approx, exact)]
+        report.append({"n_probe": n_probe, "recall": float(np.mean(hits)), "latency_ms": approx_ms})
+    return report
@@ -0,0 +1,221 @@
+"""First-run setup shared by main.py and the serve.py launcher: the sample
+catalog, the content model and the SQLite database.
+
+serve.py runs this once before starting its workers, so several workers
+never build the same files at the same time.
+"""
+
+import hashlib
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pandas as pd
+
+from model_store import model_exists
+
+MODEL_DIR = 'models/recommender'
+CF_MODEL_DIR = 'models/cf'
+LEGACY_SIMILARITY_PATH = 'models/similarity.pkl'
+
+# ============================================
+# CREATE NECESSARY FILES IF THEY DON'T EXIST
+# ============================================
+
+def create_required_files():
+    """Create all necessary files and folders"""
+    
+    # Create directories
+    os.makedirs('data', exist_ok=True)
+    os.makedirs('models', exist_ok=True)
+    
+    # 1. Create movies.csv if it doesn't exist
+    if not os.path.exists('data/movies.csv'):
+        print("Creating movies.csv...")
+        
+        # Sample movie data (you should replace this with your actual data)
+        sample_movies = [
+            {
+                "title": "The Dark Knight",
+                "movie_id": 155,
+                "genres": "Action|Crime|Drama",
+                "rating": 9.0,
+                "overview": "Batman faces the Joker, a criminal mastermind who seeks to undermine society."
+            },
+            {
+                "title": "Inception",
+                "movie_id": 27205,
+                "genres": "Action|Sci-Fi|Thriller",
+                "rating": 8.8,
+                "overview": "A thief who steals corporate secrets through dream-sharing technology."
+            },
+            {
+                "title": "Pulp Fiction",
+                "movie_id": 680,
+                "genres": "Crime|Drama",
+                "rating": 8.9,
+                "overview": "The lives of two mob hitmen, a boxer, and a pair of diner bandits intertwine."
+            },
+            {
+                "title": "Forrest Gump",
+                "movie_id": 13,
+                "genres": "Drama|Romance",
+                "rating": 8.8,
+                "overview": "The presidencies of Kennedy and Johnson, the events of Vietnam."
+            },
+            {
+                "title": "The Godfather",
+                "movie_id": 238,
+                "genres": "Crime|Drama",
+                "rating": 9.2,
+                "overview": "The aging patriarch of an organized crime dynasty transfers control to his son."
+            },
+            {
+                "title": "The Shawshank Redemption",
+                "movie_id": 278,
+                "genres": "Drama",
+                "rating": 9.3,
+                "overview": "Two imprisoned men bond over a number of years."
+            },
+            {
+                "title": "Fight Club",
+                "movie_id": 550,
+                "genres": "Drama",
+                "rating": 8.8,
+                "overview": "An insomniac office worker and a devil-may-care soapmaker form an underground fight club."
+            },
+            {
+                "title": "The Matrix",
+                "movie_id": 603,
+                "genres": "Action|Sci-Fi",
+                "rating": 8.7,
+                "overview": "A computer hacker learns about the true nature of his reality."
+            },
+            {
+                "title": "Interstellar",
+                "movie_id": 157336,
+                "genres": "Adventure|Drama|Sci-Fi",
+                "rating": 8.6,
+                "overview": "A team of explorers travel through a wormhole in space."
+            },
+            {
+                "title": "Parasite",
+                "movie_id": 496243,
+                "genres": "Comedy|Drama|Thriller",
+                "rating": 8.6,
+                "overview": "A poor family schemes to become employed by a wealthy family."
+            }
+        ]
+        
+        df = pd.DataFrame(sample_movies)
+        df.to_csv('data/movies.csv', index=False)
+        print(f"Created data/movies.csv with {len(df)} movies")
+    
+    # 2. Build the similarity model from movie content if there is no model yet
+    if not model_exists(MODEL_DIR) and not os.path.exists(LEGACY_SIMILARITY_PATH):
+        print("Building similarity model from data/movies.csv...")
+        subprocess.run([sys.executable, 'build_model.py', 'content', '--output', MODEL_DIR], check=True)
+    
+    # 3. Create SQLite database
+    if not os.path.exists('data/movies.db'):
+        print("Creating SQLite database...")
+        create_database()
+    
+    print("✅ All required files created successfully!")
+
+def create_database():
+    """Create SQLite database with movies table"""
+    conn = sqlite3.connect('data/movies.db')
+    cursor = conn.cursor()
+    
+    # Create movies table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS movies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        movie_id INTEGER,
+        genres TEXT,
+        rating REAL,
+        overview TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Create user interactions table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_interactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        movie_title TEXT,
+        action TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''')
+    
+    # Create users table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        role TEXT DEFAULT 'user',
+        is_active INTEGER DEFAULT 1,
+        is_blocked INTEGER DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_login DATETIME
+    )
+    ''')
+    
+    # Create comments/reviews table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS comments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        movie_title TEXT,
+        comment_text TEXT NOT NULL,
+        rating REAL,
+        is_approved INTEGER DEFAULT 1,
+        is_flagged INTEGER DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''')
+    
+    # Create admin actions log
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS admin_actions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        admin_id INTEGER,
+        action_type TEXT,
+        target_type TEXT,
+        target_id INTEGER,
+        details TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (admin_id) REFERENCES users(id)
+    )
+    ''')
+    
+    # Insert default admin user (username: admin, password: admin123)
+    # In production, use proper password hashing
+    admin_password_hash = hashlib.sha256("admin123".encode()).hexdigest()
+    cursor.execute('''
+        INSERT OR IGNORE INTO users (username, email, password_hash, role, is_active)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ("admin", "admin@movieapp.com", admin_password_hash, "admin", 1))
+    
+    # Insert sample data from movies.csv
+    if os.path.exists('data/movies.csv'):
+        df = pd.read_csv('data/movies.csv')
+        for _, row in df.iterrows():
+            cursor.execute('''
+                INSERT OR IGNORE INTO movies (title, movie_id, genres, rating, overview)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (row['title'], row['movie_id'], row['genres'], row['rating'], row['overview']))
+    
+    conn.commit()
+    conn.close()
+    print("Created data/movies.db")
@@ -0,0 +1,379 @@
+"""Offline model build steps for the recommendation backend.
+
+Run from the backend directory, e.g.:
+
+    python build_model.py content --k 100
+    python build_model.py content --model embeddings --dim 64
+    python build_model.py bench-ann
+    python build_model.py cf --k 100
+    python build_model.py neighbors --k 100
+    python build_model.py export --quantize int8
+    python build_model.py evaluate --k 10
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import svds
+
+from ann import IVFIndex, benchmark_recall
+from catalog import CatalogIndex
+from collaborative import POPULARITY_FILE, interaction_matrix, item_vectors, popularity
+from evaluation import evaluate_variant, load_holdout, model_variants
+from features import FEATURIZER_FILE, ContentFeaturizer, prepare_catalog
+from model_store import catalog_checksum, load_model, row_hashes, save_model
+from recommender import QUANTIZE_MODES, EmbeddingModel, NeighborIndex, load_legacy_similarity, top_k_rows
+
+
+def report_quantization(full, quantized, k=10, sample_size=1000, seed=0):
+    """Print memory saved and mean top-k overlap of a quantized model vs full precision"""
+    n = full.n_items
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(n, size=min(sample_size, n), replace=False)
+
+    overlaps = []
+    for idx in sample:
+        expected, _ = full.neighbors(idx, k)
+        actual, _ = quantized.neighbors(idx, k)
+        if len(expected):
+            overlaps.append(len(np.intersect1d(expected, actual)) / len(expected))
+    overlap = float(np.mean(overlaps)) if overlaps else 1.0
+
+    saved = full.nbytes - quantized.nbytes
+    print(f"📊 Quantized to {quantized.dtype}: {full.nbytes / 1e6:.2f} MB -> {quantized.nbytes / 1e6:.2f} MB "
+          f"({saved / 1e6:.2f} MB saved, {100 * saved / max(full.nbytes, 1):.0f}%)")
+    print(f"📊 Mean top-{k} overlap with full precision over {len(sample)} movies: {overlap:.4f}")
+    return {"bytes_full": full.nbytes, "bytes_quantized": quantized.nbytes, "topk_overlap": overlap}
+
+
+def finish_model(model, args, checksum=None, extras=None, hashes=None):
+    """Optionally quantize `model`, then save it next to the catalog checksum.
+
+    Without a `checksum`, the checksum and row hashes of `args.catalog` are
+    stored, so the backend can tell later admin edits from a different catalog.
+    """
+    if args.quantize != "none":
+        quantized = model.quantize(args.quantize)
+        report_quantization(model, quantized, k=args.report_k)
+        model = quantized
+    if checksum is None:
+        movies_df = pd.read_csv(args.catalog)
+        checksum = catalog_checksum(movies_df)
+        if hashes is None:
+            hashes = row_hashes(movies_df)
+    save_model(model, args.output, checksum, extras=extras, hashes=hashes)
+    return model
+
+
+# Feature matrix shared with worker processes (set once per worker)
+_features = None
+
+
+def _init_worker(features):
+    """Use `features`, or open the matrix `_share_features` wrote to that directory"""
+    global _features
+    if isinstance(features, str):
+        arrays = [np.load(os.path.join(features, f"{name}.npy"), mmap_mode="r")
+                  for name in ("data", "indices", "indptr")]
+        with open(os.path.join(features, "shape.json")) as f:
+            shape = tuple(json.load(f))
+        features = sp.csr_matrix(tuple(arrays), shape=shape, copy=False)
+    _features = features
+
+
+def _share_features(features, directory):
+    """Write a CSR matrix as .npy files that workers memory-map instead of receiving a pickled copy"""
+    # scipy copies index arrays of mixed dtypes, which would defeat the mapping
+    index_dtype = np.result_type(features.indices.dtype, features.indptr.dtype)
+    np.save(os.path.join(directory, "data.npy"), features.data)
+    np.save(os.path.join(directory, "indices.npy"), features.indices.astype(index_dtype, copy=False))
+    np.save(os.path.join(directory, "indptr.npy"), features.indptr.astype(index_dtype, copy=False))
+    with open(os.path.join(directory, "shape.json"), "w") as f:
+        json.dump(list(features.shape), f)
+    return directory
+
+
+def _block_neighbors(start, stop, k):
+    """Top-k cosine neighbors for catalog rows start..stop"""
+    # (features @ block.T).T only transposes the small block, not the whole matrix
+    block = (_features @ _features[start:stop].T).T.toarray()
+    indices, scores = top_k_rows(block, k, np.arange(start, stop))
+    return start, indices, scores
+
+
+def content_neighbors(features, k, workers=None, memory_mb=256):
+    """Top-k cosine neighbors of every row of a unit-normalized feature matrix.
+
+    Similarities are computed one block of rows at a time; each block is sized
+    so its dense (rows x N) float32 scores stay within `memory_mb` per worker.
+    Blocks are spread over `workers` processes, which memory-map one copy of
+    the features from a temporary directory.
+    """
+    n = features.shape[0]
+    k = max(0, min(k, n - 1))
+    workers = workers or os.cpu_count() or 1
+    block_rows = max(1, int(memory_mb * 1e6 // (n * 4 * 2)))
+    starts = list(range(0, n, block_rows))
+    stops = [min(start + block_rows, n) for start in starts]
+
+    indices = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+
+    def collect(results):
+        for start, block_indices, block_scores in results:
+            stop = start + block_indices.shape[0]
+            indices[start:stop] = block_indices
+            scores[start:stop] = block_scores
+
+    if workers == 1 or len(starts) == 1:
+        _init_worker(features)
+        collect(map(_block_neighbors, starts, stops, repeat(k)))
+    else:
+        features = sp.csr_matrix(features)
+        with tempfile.TemporaryDirectory(prefix="features-") as directory, \
+                ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                    initargs=(_share_features(features, directory),)) as pool:
+            collect(pool.map(_block_neighbors, starts, stops, repeat(k)))
+
+    indptr = np.arange(n + 1, dtype=np.int64) * k
+    return NeighborIndex(indptr, indices.ravel(), scores.ravel())
+
+
+def positive_neighbors(index):
+    """Copy of a neighbor index keeping only neighbors with a positive score"""
+    n = index.n_items
+    scores = np.asarray(index.scores)
+    keep = scores > 0
+    rows = np.repeat(np.arange(n), np.diff(index.indptr))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(rows[keep], minlength=n))
+    return NeighborIndex(indptr, np.asarray(index.indices)[keep], scores[keep])
+
+
+def content_embeddings(features, dim=64, seed=0):
+    """Truncated SVD of the feature matrix as unit-length float32 embeddings"""
+    dim = max(1, min(dim, min(features.shape) - 1))
+    v0 = np.random.default_rng(seed).random(min(features.shape))
+    _, singular_values, components = svds(features, k=dim, v0=v0)
+    order = np.argsort(-singular_values)
+    components = np.ascontiguousarray(components[order], dtype=np.float32)
+
+    embeddings = np.asarray(features @ components.T, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return EmbeddingModel(embeddings / norms, components)
+
+
+def read_catalog(catalog_path):
+    """Catalog rows in serving order (data/movies.csv is what the backend serves)"""
+    return prepare_catalog(pd.read_csv(catalog_path))
+
+
+def build_content(args):
+    """Build a neighbor index from TF-IDF overview and one-hot genre features"""
+    started = time.time()
+    movies_df = read_catalog(args.catalog)
+    print(f"📦 Loaded {len(movies_df)} movies from {args.catalog}")
+
+    featurizer = ContentFeaturizer.fit(movies_df, max_features=args.max_features,
+                                       min_df=args.min_df, genre_weight=args.genre_weight)
+    features = featurizer.transform(movies_df)
+    print(f"🔤 Features: {features.shape[1]} columns ({len(featurizer.vocabulary)} terms, "
+          f"{len(featurizer.genres)} genres), {features.nnz} non-zeros")
+
+    if args.model == "embeddings":
+        model = content_embeddings(features, args.dim)
+        model.n_probe, model.exact_below = args.n_probe, args.exact_below
+        n_lists = args.ann_lists
+        if n_lists < 0:
+            n_lists = int(4 * np.sqrt(model.n_items)) if model.n_items >= args.exact_below else 0
+        if n_lists:
+            model.ann = IVFIndex.build(model, n_lists)
+            print(f"🧭 ANN index: {model.ann.n_lists} inverted lists, {args.n_probe} probed per query")
+    else:
+        model = content_neighbors(features, args.k, workers=args.workers, memory_mb=args.memory_mb)
+        # Keep the features so the backend can add movies without a rebuild
+        model.features = features
+    # Row hashes let the backend patch in movies added or edited after this build
+    model = finish_model(model, args, checksum=catalog_checksum(movies_df),
+                         extras={FEATURIZER_FILE: featurizer.to_dict()}, hashes=row_hashes(movies_df))
+
+    print(f"✅ Wrote {args.output}: {model.kind} {model.shape} "
+          f"({model.nbytes / 1e6:.2f} MB) in {time.time() - started:.1f}s")
+
+
+def build_cf(args):
+    """Build an item-item collaborative filtering neighbor index from user interactions"""
+    started = time.time()
+    movies_df = read_catalog(args.catalog)
+    title_rows = CatalogIndex.from_dataframe(movies_df).by_title
+
+    matrix, n_read = interaction_matrix(args.db, title_rows, len(movies_df), chunk_rows=args.chunk_rows)
+    print(f"📦 Read {n_read} interactions: {matrix.shape[0]} users x {matrix.shape[1]} movies, "
+          f"{matrix.nnz} (user, movie) pairs")
+
+    # Cosine between item columns; movies nobody shares get an empty list
+    index = content_neighbors(item_vectors(matrix), args.k, workers=args.workers, memory_mb=args.memory_mb)
+    index = finish_model(positive_neighbors(index), args, checksum=catalog_checksum(movies_df),
+                         extras={POPULARITY_FILE: popularity(matrix).tolist()})
+
+    print(f"✅ Wrote {args.output}: {index.kind} {index.shape} "
+          f"({index.nbytes / 1e6:.2f} MB) in {time.time() - started:.1f}s")
+
+
+def build_neighbors(args):
+    """Convert a dense similarity matrix into a top-K neighbor index"""
+    print(f"📦 Loading dense similarity matrix from {args.source}...")
+    dense = load_legacy_similarity(args.source)
+
+    index = NeighborIndex.from_dense(dense.matrix, args.k, block_rows=args.block_rows)
+    index = finish_model(index, args)
+
+    print(f"✅ Wrote {args.output}: {index.n_items} movies x {index.shape[1]} neighbors "
+          f"({index.nbytes / 1e6:.2f} MB, dense matrix was {dense.nbytes / 1e6:.2f} MB)")
+
+
+def export_dense(args):
+    """Re-save a pickled dense matrix in the memory-mapped model format"""
+    print(f"📦 Loading dense similarity matrix from {args.source}...")
+    dense = finish_model(load_legacy_similarity(args.source), args)
+    print(f"✅ Wrote {args.output}: {dense.shape} {dense.dtype} dense matrix ({dense.nbytes / 1e6:.2f} MB)")
+
+
+def bench_ann(args):
+    """Recall@k and latency of the ANN index against exact search"""
+    model = load_model(args.model_dir)
+    if getattr(model, "ann", None) is None:
+        print(f"❌ {args.model_dir} has no ANN index (build with --model embeddings --ann-lists N)")
+        return
+
+    n_probes = [int(value) for value in args.n_probes.split(",")]
+    print(f"📊 {model.n_items} movies, {model.ann.n_lists} lists, recall@{args.k} over {args.queries} queries")
+    for row in benchmark_recall(model, k=args.k, n_queries=args.queries, n_probes=n_probes):
+        label = "exact" if row["n_probe"] is None else f"n_probe={row['n_probe']}"
+        print(f"   {label:>12}: recall {row['recall']:.4f}, {row['latency_ms']:.3f} ms/query")
+
+
+def evaluate(args):
+    """Replay held-out likes against each model variant and report quality and speed"""
+    movies_df = read_catalog(args.catalog)
+    title_rows = CatalogIndex.from_dataframe(movies_df).by_title
+    users = load_holdout(args.db, title_rows, holdout=args.holdout, min_likes=args.min_likes,
+                         max_users=args.max_users)
+    if not users:
+        print(f"❌ No users with at least {args.min_likes} liked catalog movies in {args.db}")
+        return
+    print(f"📦 {len(users)} users, {sum(len(test) for _, _, test in users)} held-out likes, "
+          f"{len(movies_df)} movies")
+
+    report = []
+    for name, path, load in model_variants(args.models.split(",")):
+        result = evaluate_variant(load, users, args.k, len(movies_df), memory_users=args.memory_users)
+        # Several directories can hold the same kind of model, so the path is part of the label
+        report.append({"variant": name, "path": path, "label": f"{name} {path}", **result})
+
+    width = max([len("variant")] + [len(row['label']) for row in report]) + 2
+    print(f"📊 @{args.k}  {'variant':<{width}}{'precision':>10}{'recall':>8}{'ndcg':>8}{'coverage':>10}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak MB':>9}{'model MB':>10}")
+    for row in report:
+        print(f"       {row['label']:<{width}}{row['precision']:>10.4f}{row['recall']:>8.4f}{row['ndcg']:>8.4f}"
+              f"{row['coverage']:>10.4f}{row['p50_ms']:>9.3f}{row['p95_ms']:>9.3f}{row['p99_ms']:>9.3f}"
+              f"{row['peak_mb']:>9.2f}{row['model_mb']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"k": args.k, "users": len(users), "variants": report}, f, indent=2)
+        print(f"✅ Wrote {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build recommendation model artifacts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common_arguments(subparser):
+        subparser.add_argument("--catalog", default="data/movies.csv",
+                               help="Catalog the model rows refer to (stored as a checksum)")
+        subparser.add_argument("--output", default="models/recommender")
+        subparser.add_argument("--quantize", choices=["none", *QUANTIZE_MODES], default="none",
+                               help="Store scores as float16, or int8 with a per-row scale")
+        subparser.add_argument("--report-k", type=int, default=10,
+                               help="k used for the quantization top-k overlap report")
+
+    content = subparsers.add_parser("content", help="Neighbor index from movie overviews and genres")
+    add_common_arguments(content)
+    content.add_argument("--model", choices=["neighbors", "embeddings"], default="neighbors",
+                         help="Precomputed top-K neighbors, or embeddings scored per request")
+    content.add_argument("--k", type=int, default=100, help="Neighbors kept per movie")
+    content.add_argument("--dim", type=int, default=64, help="Embedding dimensions (--model embeddings)")
+    content.add_argument("--max-features", type=int, default=50000, help="TF-IDF vocabulary size")
+    content.add_argument("--min-df", type=int, default=1, help="Minimum document frequency of a term")
+    content.add_argument("--genre-weight", type=float, default=1.0)
+    content.add_argument("--ann-lists", type=int, default=-1,
+                         help="IVF lists for approximate search (-1: automatic, 0: exact search only)")
+    content.add_argument("--n-probe", type=int, default=8, help="IVF lists probed per query")
+    content.add_argument("--exact-below", type=int, default=10000,
+                         help="Catalogs smaller than this always use exact search")
+    content.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    content.add_argument("--memory-mb", type=int, default=256,
+                         help="Score block memory budget per worker")
+    content.set_defaults(func=build_content)
+
+    cf = subparsers.add_parser("cf", help="Item-item collaborative filtering index from user interactions")
+    add_common_arguments(cf)
+    cf.set_defaults(output="models/cf")
+    cf.add_argument("--db", default="data/movies.db")
+    cf.add_argument("--k", type=int, default=100, help="Neighbors kept per movie")
+    cf.add_argument("--chunk-rows", type=int, default=1_000_000,
+                    help="Interaction rows read from SQLite per chunk")
+    cf.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    cf.add_argument("--memory-mb", type=int, default=256, help="Score block memory budget per worker")
+    cf.set_defaults(func=build_cf)
+
+    bench = subparsers.add_parser("bench-ann", help="Recall@k benchmark of ANN vs exact search")
+    bench.add_argument("--model-dir", default="models/recommender")
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--n-probes", default="1,2,4,8,16,32")
+    bench.set_defaults(func=bench_ann)
+
+    evaluation = subparsers.add_parser("evaluate", help="Precision/recall/NDCG and latency on held-out likes")
+    evaluation.add_argument("--catalog", default="data/movies.csv")
+    evaluation.add_argument("--db", default="data/movies.db")
+    evaluation.add_argument("--models", default="models/similarity.pkl,models/recommender",
+                            help="Comma-separated model directories or dense .pkl files")
+    evaluation.add_argument("--k", type=int, default=10)
+    evaluation.add_argument("--holdout", type=float, default=0.2,
+                            help="Fraction of each user's latest likes hidden from the profile")
+    evaluation.add_argument("--min-likes", type=int, default=2)
+    evaluation.add_argument("--max-users", type=int, default=None, help="Evaluate a random sample of users")
+    evaluation.add_argument("--memory-users", type=int, default=100,
+                            help="Queries replayed while tracing peak memory")
+    evaluation.add_argument("--json", default=None, help="Also write the report to this file")
+    evaluation.set_defaults(func=evaluate)
+
+    neighbors = subparsers.add_parser("neighbors", help="Top-K neighbor index from a dense similarity.pkl")
+    add_common_arguments(neighbors)
+    neighbors.add_argument("--source", default="models/similarity.pkl")
+    neighbors.add_argument("--k", type=int, default=100, help="Neighbors kept per movie")
+    neighbors.add_argument("--block-rows", type=int, default=1024)
+    neighbors.set_defaults(func=build_neighbors)
+
+    export = subparsers.add_parser("export", help="Dense similarity.pkl to the memory-mapped format")
+    add_common_arguments(export)
+    export.add_argument("--source", default="models/similarity.pkl")
+    export.set_defaults(func=export_dense)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""In-process LRU cache for recommendation rankings"""
+
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Thread-safe LRU cache of values (e.g. rankings) for one model version at a time.
+
+    Every lookup and store passes the model version it was computed under.
+    `current_version()` returns the version being served; when it changes,
+    all entries are dropped, so swapping the model or editing the catalog
+    never serves stale results and no manual flush is needed. Lookups and
+    stores from requests still running on another version are ignored, so
+    they can neither flush nor pollute the current entries. Without
+    `current_version`, the highest version passed in counts as current.
+    """
+
+    def __init__(self, max_entries=2048, current_version=None):
+        self.max_entries = max_entries
+        self.current_version = current_version
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_requests = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        """Whether `version` is the one being served; flushes the entries when that changed"""
+        if self.current_version is not None:
+            current = self.current_version()
+        else:
+            current = version if self.version is None else max(version, self.version)
+        if current != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = current
+        if version != current:
+            self.stale_requests += 1
+            return False
+        return True
+
+    def get(self, key, version):
+        """Cached value for `key`, or None on a miss"""
+        with self._lock:
+            value = self._entries.get(key) if self._check_version(version) else None
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, version, value):
+        with self._lock:
+            if not self._check_version(version):
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_requests": self.stale_requests,
+                "model_version": self.version,
+            }
@@ -0,0 +1,153 @@
+"""Constant-time lookup of catalog rows by title, movie_id or normalized title,
+plus precomputed genre bitmasks and ratings for filtering recommendations"""
+
+import difflib
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from features import split_genres
+
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Fuzzy suggestions only consider titles with a word starting like a word of the query
+SUGGEST_PREFIX = 3
+MAX_SUGGEST_CANDIDATES = 500
+
+
+def normalize_title(title):
+    """Case-, accent- and punctuation-insensitive form of a title"""
+    if not isinstance(title, str):
+        return ""
+    ascii_title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode()
+    return NON_ALNUM.sub(" ", ascii_title.lower()).strip()
+
+
+class CatalogIndex:
+    """Hash maps from title, movie_id and normalized title to catalog row.
+
+    When several rows share a key the first one wins, matching what a boolean
+    mask followed by ``.index[0]`` used to return.
+
+    Genres are parsed once into `genre_masks`, an (N x words) uint64 array
+    where bit `genre_bits[genre]` is set for every movie in that genre, so a
+    genre filter is a couple of vectorized bitwise operations per request.
+
+    Title words are indexed too (`by_word`, plus the sorted `words` for
+    prefix lookups), so `suggest` only compares a query against titles that
+    share a word prefix with it instead of scanning the whole catalog.
+    """
+
+    def __init__(self, titles, movie_ids, genres=None, ratings=None):
+        self.titles = list(titles)
+        self.by_title = {}
+        self.by_movie_id = {}
+        self.by_normalized = {}
+        self.by_word = {}
+        for row, (title, movie_id) in enumerate(zip(self.titles, movie_ids)):
+            self.by_title.setdefault(title, row)
+            normalized = normalize_title(title)
+            if normalized not in self.by_normalized:
+                self.by_normalized[normalized] = row
+                for word in set(normalized.split()):
+                    self.by_word.setdefault(word, []).append(normalized)
+            if pd.notna(movie_id):
+                self.by_movie_id.setdefault(int(movie_id), row)
+        self.words = sorted(self.by_word)
+
+        # Most movies share a handful of genre strings: parse each distinct one once
+        n = len(self.titles)
+        codes, values = pd.factorize(pd.Series(genres if genres is not None else [""] * n, dtype=object))
+        genre_lists = [split_genres(value) for value in values]
+        self.genre_bits = {genre: bit for bit, genre in
+                           enumerate(sorted({genre for genre_list in genre_lists for genre in genre_list}))}
+        value_masks = np.zeros((len(values) + 1, max(1, -(-len(self.genre_bits) // 64))), dtype=np.uint64)
+        for code, genre_list in enumerate(genre_lists):
+            for genre in genre_list:
+                bit = self.genre_bits[genre]
+                value_masks[code, bit // 64] |= np.uint64(1 << (bit % 64))
+        # Missing genres have code -1, which picks the all-zero last row
+        self.genre_masks = value_masks[codes]
+
+        ratings = pd.to_numeric(pd.Series(ratings), errors='coerce') if ratings is not None else None
+        self.ratings = (ratings.to_numpy(dtype=np.float32, na_value=np.nan) if ratings is not None
+                        else np.full(n, np.nan, dtype=np.float32))
+
+    @classmethod
+    def from_dataframe(cls, movies_df):
+        return cls(movies_df['title'], movies_df['movie_id'], movies_df.get('genres'), movies_df.get('rating'))
+
+    def __len__(self):
+        return len(self.titles)
+
+    def row(self, title=None, movie_id=None):
+        """Row for an exact title, then a normalized title, then a movie_id; None if absent"""
+        if title is not None:
+            row = self.by_title.get(title)
+            if row is None:
+                row = self.by_normalized.get(normalize_title(title))
+            if row is not None:
+                return row
+        if movie_id is not None:
+            return self.by_movie_id.get(movie_id)
+        return None
+
+    def genre_query(self, genres):
+        """Bitmask row matching any of `genres`; raises KeyError on an unknown genre"""
+        query = np.zeros(self.genre_masks.shape[1], dtype=np.uint64)
+        for genre in genres:
+            bit = self.genre_bits[genre]
+            query[bit // 64] |= np.uint64(1 << (bit % 64))
+        return query
+
+    def filter_mask(self, genres=None, min_rating=None):
+        """Boolean mask of rows in any of `genres` and rated at least `min_rating`.
+
+        Returns None when no filter is given. Raises KeyError for a genre the
+        catalog does not have.
+        """
+        if not genres and min_rating is None:
+            return None
+        mask = np.ones(len(self.titles), dtype=bool)
+        if genres:
+            mask &= (self.genre_masks & self.genre_query(genres)).any(axis=1)
+        if min_rating is not None:
+            mask &= self.ratings >= min_rating
+        return mask
+
+    def suggestion_candidates(self, key):
+        """Normalized titles sharing the most word prefixes with the normalized query `key`"""
+        counts = Counter()
+        for word in set(key.split()):
+            prefix = word[:SUGGEST_PREFIX]
+            start = bisect_left(self.words, prefix)
+            # Normalized words are [a-z0-9], all of which sort before "{"
+            for title_word in self.words[start:bisect_left(self.words, prefix + "{", start)]:
+                counts.update(self.by_word[title_word])
+        return [normalized for normalized, _ in counts.most_common(MAX_SUGGEST_CANDIDATES)]
+
+    def suggest(self, query, limit=5):
+        """Up to `limit` titles close to `query`: substring matches first, then fuzzy ones.
+
+        Only titles with a word starting with the first letters of a query
+        word are considered (see `suggestion_candidates`).
+        """
+        key = normalize_title(query)
+        if not key:
+            return []
+
+        candidates = self.suggestion_candidates(key)
+        substring_rows = sorted(self.by_normalized[normalized] for normalized in candidates if key in normalized)
+        suggestions = [self.titles[row] for row in substring_rows[:limit]]
+        if len(suggestions) == limit:
+            return suggestions
+
+        for normalized in difflib.get_close_matches(key, candidates, n=limit, cutoff=0.6):
+            title = self.titles[self.by_normalized[normalized]]
+            if title not in suggestions:
+                suggestions.append(title)
+        return suggestions[:limit]
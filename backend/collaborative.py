@@ -0,0 +1,70 @@
+"""Item-item collaborative filtering inputs built from logged user interactions"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# Signed weight of each interaction kind in the user x item matrix
+ACTION_WEIGHTS = {"like": 1.0, "dislike": -1.0}
+
+# Model extra holding the per-movie like counts (see model_store.save_model)
+POPULARITY_FILE = "popularity.json"
+
+
+def interaction_matrix(db_path, title_rows, n_items, chunk_rows=1_000_000):
+    """Sparse (users x items) matrix of likes (+1) and dislikes (-1).
+
+    `user_interactions` is streamed `chunk_rows` rows at a time and each chunk
+    is folded into the running sparse sum, so memory grows with the number of
+    distinct (user, movie) pairs rather than with the table size. Repeated
+    interactions with the same movie are summed and clipped to [-1, 1].
+    Titles missing from `title_rows` (title -> catalog row) are skipped.
+    """
+    conn = sqlite3.connect(db_path)
+    query = (
+        "SELECT user_id, movie_title, action FROM user_interactions "
+        "WHERE user_id IS NOT NULL AND action IN ({})".format(",".join("?" * len(ACTION_WEIGHTS)))
+    )
+
+    matrix = None
+    n_read = 0
+    for chunk in pd.read_sql_query(query, conn, params=list(ACTION_WEIGHTS), chunksize=chunk_rows):
+        n_read += len(chunk)
+        rows = chunk['movie_title'].map(title_rows)
+        keep = rows.notna().to_numpy()
+        if not keep.any():
+            continue
+        users = chunk['user_id'].to_numpy(dtype=np.int64)[keep]
+        items = rows.to_numpy()[keep].astype(np.int64)
+        weights = chunk['action'].map(ACTION_WEIGHTS).to_numpy(dtype=np.float32)[keep]
+
+        n_users = max(int(users.max()) + 1, matrix.shape[0] if matrix is not None else 0)
+        part = sp.csr_matrix((weights, (users, items)), shape=(n_users, n_items))
+        if matrix is None:
+            matrix = part
+        else:
+            matrix.resize((n_users, n_items))
+            matrix = matrix + part
+    conn.close()
+
+    if matrix is None:
+        matrix = sp.csr_matrix((0, n_items), dtype=np.float32)
+    matrix.data = np.clip(matrix.data, -1.0, 1.0)
+    matrix.eliminate_zeros()
+    return matrix, n_read
+
+
+def item_vectors(matrix):
+    """Items as unit-length rows over users, so dot products are cosine similarities"""
+    items = sp.csr_matrix(matrix.T, dtype=np.float32)
+    norms = np.sqrt(np.asarray(items.multiply(items).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.csr_matrix(sp.diags(1.0 / norms).dot(items), dtype=np.float32)
+
+
+
+def popularity(matrix):
+    """Number of users who liked each item"""
+    return np.asarray((matrix > 0).sum(axis=0)).ravel().astype(np.int64)
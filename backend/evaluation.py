@@ -0,0 +1,144 @@
+"""Offline evaluation of recommendation quality and speed against held-out likes.
+
+Each user's likes are split by time: the latest `holdout` fraction is hidden
+and the rest build a `UserProfile`, exactly as `/users/{id}/recommendations`
+does. The top-k list is then scored against the hidden likes.
+"""
+
+import os
+import sqlite3
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from model_store import load_model, model_exists
+from profiles import UserProfile
+from recommender import load_legacy_similarity
+
+
+def load_holdout(db_path, title_rows, holdout=0.2, min_likes=2, max_users=None, seed=0):
+    """(user_id, train_rows, test_rows) per user with at least `min_likes` liked catalog movies.
+
+    Likes are ordered by timestamp and the latest `holdout` fraction (at least
+    one, and never all of them) is held out. With `max_users`, a random sample
+    of the eligible users is returned.
+    """
+    conn = sqlite3.connect(db_path)
+    likes = pd.read_sql_query(
+        "SELECT user_id, movie_title FROM user_interactions "
+        "WHERE user_id IS NOT NULL AND action = 'like' ORDER BY timestamp, id", conn)
+    conn.close()
+
+    likes['row'] = likes['movie_title'].map(title_rows)
+    likes = likes.dropna(subset=['row']).drop_duplicates(subset=['user_id', 'row'])
+
+    users = []
+    for user_id, group in likes.groupby('user_id', sort=True):
+        rows = group['row'].to_numpy(dtype=np.intp)
+        if len(rows) < max(min_likes, 2):
+            continue
+        n_test = min(max(1, int(round(len(rows) * holdout))), len(rows) - 1)
+        users.append((int(user_id), rows[:-n_test], rows[-n_test:]))
+
+    if max_users is not None and len(users) > max_users:
+        rng = np.random.default_rng(seed)
+        users = [users[i] for i in sorted(rng.choice(len(users), size=max_users, replace=False))]
+    return users
+
+
+def ranking_metrics(recommended, relevant, k):
+    """precision@k, recall@k and NDCG@k of one recommendation list (binary relevance)"""
+    recommended = list(recommended)[:k]
+    hits = np.array([row in relevant for row in recommended], dtype=np.float64)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(len(relevant), k)].sum()
+    return {
+        "precision": hits.sum() / k,
+        "recall": hits.sum() / len(relevant),
+        "ndcg": float(hits @ discounts[:len(hits)] / ideal) if ideal else 0.0,
+    }
+
+
+def _recommend(model, train_rows, k, limit):
+    profile = UserProfile(model)
+    profile.add(train_rows)
+    return profile.recommend(k, limit=limit)[0]
+
+
+def evaluate_variant(load, users, k, n_items, memory_users=100):
+    """Quality, latency and peak memory of one model variant.
+
+    `load()` returns the model. Metrics and per-query latency come from an
+    untraced pass over every user; peak memory is traced separately over the
+    load plus up to `memory_users` queries, since tracing slows allocation.
+    Memory-mapped model pages are not Python allocations and are not counted.
+    """
+    tracemalloc.start()
+    model = load()
+    for _, train_rows, _ in users[:memory_users]:
+        _recommend(model, train_rows, k, n_items)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    totals = {"precision": 0.0, "recall": 0.0, "ndcg": 0.0}
+    latencies = np.empty(len(users), dtype=np.float64)
+    recommended_rows = set()
+    for i, (_, train_rows, test_rows) in enumerate(users):
+        started = time.perf_counter()
+        recommended = _recommend(model, train_rows, k, n_items)
+        latencies[i] = (time.perf_counter() - started) * 1000
+        recommended_rows.update(int(row) for row in recommended)
+        for name, value in ranking_metrics(recommended, set(int(row) for row in test_rows), k).items():
+            totals[name] += value
+
+    n = max(len(users), 1)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(users) else (0.0, 0.0, 0.0)
+    return {
+        "kind": model.kind,
+        "model_mb": model.nbytes / 1e6,
+        **{name: value / n for name, value in totals.items()},
+        "coverage": len(recommended_rows) / max(n_items, 1),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "peak_mb": peak / 1e6,
+    }
+
+
+def model_variants(paths):
+    """(name, path, loader) for each model path that exists.
+
+    A `.pkl` path is a legacy dense matrix; anything else is a model directory.
+    An embedding model with an ANN index yields an exact and an ANN variant.
+    """
+    variants = []
+    for path in paths:
+        if path.endswith(".pkl"):
+            if os.path.exists(path):
+                variants.append(("dense", path, lambda path=path: load_legacy_similarity(path)))
+            else:
+                print(f"⚠️ Skipping {path}: not found")
+            continue
+        if not model_exists(path):
+            print(f"⚠️ Skipping {path}: no model")
+            continue
+
+        model = load_model(path)
+        if model.kind != "embeddings":
+            variants.append((model.kind, path, lambda path=path: load_model(path)))
+            continue
+        variants.append(("embeddings", path, lambda path=path: _with_search(load_model(path), exact=True)))
+        if model.ann is not None:
+            variants.append(("ann", path, lambda path=path: _with_search(load_model(path), exact=False)))
+    return variants
+
+
+def _with_search(model, exact):
+    """Make an embedding model always use exact (or always ANN) search"""
+    if exact:
+        model.ann = None
+    else:
+        model.exact_below = 0
+    return model
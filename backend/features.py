@@ -0,0 +1,134 @@
+"""Content features for movies: TF-IDF over the overview plus one-hot genres"""
+
+import math
+import re
+from collections import Counter
+
+import numpy as np
+import scipy.sparse as sp
+
+# Model extra holding the fitted featurizer (see model_store.save_model)
+FEATURIZER_FILE = "featurizer.json"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]{2,}")
+STOP_WORDS = frozenset("""
+    a an and are as at be by for from has he her his in is it its of on or
+    she that the their they this to was who with while into over through
+""".split())
+
+
+def tokenize(text):
+    if not isinstance(text, str):
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def split_genres(genres):
+    if not isinstance(genres, str):
+        return []
+    return [genre.strip() for genre in genres.split("|") if genre.strip()]
+
+
+class ContentFeaturizer:
+    """Maps a movie's overview and genres to an L2-normalized feature vector.
+
+    Columns are the TF-IDF vocabulary followed by one column per genre, so a
+    movie's vector can be computed on its own once the featurizer is fitted.
+    """
+
+    def __init__(self, vocabulary, idf, genres, genre_weight=1.0):
+        self.vocabulary = list(vocabulary)
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.genres = list(genres)
+        self.genre_weight = float(genre_weight)
+        self._term_column = {term: i for i, term in enumerate(self.vocabulary)}
+        self._genre_column = {genre: len(self.vocabulary) + i for i, genre in enumerate(self.genres)}
+
+    @classmethod
+    def fit(cls, movies_df, max_features=50000, min_df=1, genre_weight=1.0):
+        """Learn the vocabulary, IDF weights and genre list from a catalog"""
+        document_frequency = Counter()
+        for overview in movies_df['overview']:
+            document_frequency.update(set(tokenize(overview)))
+
+        terms = [term for term, count in document_frequency.items() if count >= min_df]
+        terms.sort(key=lambda term: (-document_frequency[term], term))
+        vocabulary = sorted(terms[:max_features])
+
+        n = len(movies_df)
+        idf = [math.log((1 + n) / (1 + document_frequency[term])) + 1 for term in vocabulary]
+
+        genres = sorted({genre for value in movies_df['genres'] for genre in split_genres(value)})
+        return cls(vocabulary, idf, genres, genre_weight)
+
+    @property
+    def n_features(self):
+        return len(self.vocabulary) + len(self.genres)
+
+    def _row(self, overview, genres):
+        """Column indices and weights for one movie, before normalization.
+
+        The text and genre parts are each scaled to unit length first so
+        `genre_weight` sets their balance regardless of overview length.
+        """
+        counts = Counter(token for token in tokenize(overview) if token in self._term_column)
+        columns = [self._term_column[term] for term in counts]
+        weights = [count * float(self.idf[self._term_column[term]]) for term, count in counts.items()]
+        text_norm = math.sqrt(sum(weight * weight for weight in weights)) or 1.0
+        weights = [weight / text_norm for weight in weights]
+
+        genre_columns = sorted({self._genre_column[genre] for genre in split_genres(genres)
+                                if genre in self._genre_column})
+        if genre_columns:
+            genre_value = self.genre_weight / math.sqrt(len(genre_columns))
+            columns.extend(genre_columns)
+            weights.extend([genre_value] * len(genre_columns))
+        return columns, weights
+
+    def transform(self, movies_df):
+        """Sparse (n_movies x n_features) float32 matrix with unit-length rows"""
+        indptr = [0]
+        indices = []
+        data = []
+        for overview, genres in zip(movies_df['overview'], movies_df['genres']):
+            columns, weights = self._row(overview, genres)
+            indices.extend(columns)
+            data.extend(weights)
+            indptr.append(len(indices))
+
+        matrix = sp.csr_matrix((np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32),
+                                np.asarray(indptr, dtype=np.int64)),
+                               shape=(len(movies_df), self.n_features))
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms).dot(matrix), dtype=np.float32)
+
+    def transform_one(self, overview, genres):
+        """Dense unit-length feature vector for a single movie"""
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        columns, weights = self._row(overview, genres)
+        np.add.at(vector, columns, weights)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def to_dict(self):
+        return {
+            "vocabulary": self.vocabulary,
+            "idf": [float(value) for value in self.idf],
+            "genres": self.genres,
+            "genre_weight": self.genre_weight,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["vocabulary"], data["idf"], data["genres"], data.get("genre_weight", 1.0))
+
+
+def prepare_catalog(movies_df):
+    """Catalog with the text columns the featurizer reads, filled where missing"""
+    movies_df = movies_df.copy()
+    for column in ('overview', 'genres'):
+        if column not in movies_df.columns:
+            movies_df[column] = ""
+        movies_df[column] = movies_df[column].fillna("")
+    return movies_df
@@ -2,231 +2,26 @@ from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel
-import pickle
 import pandas as pd
 import sqlite3
 import numpy as np
 from typing import List, Optional
 import os
-import requests
+import subprocess
+import sys
+import threading
 import json
 import hashlib
 from datetime import datetime
 
-# ============================================
-# CREATE NECESSARY FILES IF THEY DON'T EXIST
-# ============================================
-
-def create_required_files():
-    """Create all necessary files and folders"""
-    
-    # Create directories
-    os.makedirs('data', exist_ok=True)
-    os.makedirs('models', exist_ok=True)
-    
-    # 1. Create movies.csv if it doesn't exist
-    if not os.path.exists('data/movies.csv'):
-        print("Creating movies.csv...")
-        
-        # Sample movie data (you should replace this with your actual data)
-        sample_movies = [
-            {
-                "title": "The Dark Knight",
-                "movie_id": 155,
-                "genres": "Action|Crime|Drama",
-                "rating": 9.0,
-                "overview": "Batman faces the Joker, a criminal mastermind who seeks to undermine society."
-            },
-            {
-                "title": "Inception",
-                "movie_id": 27205,
-                "genres": "Action|Sci-Fi|Thriller",
-                "rating": 8.8,
-                "overview": "A thief who steals corporate secrets through dream-sharing technology."
-            },
-            {
-                "title": "Pulp Fiction",
-                "movie_id": 680,
-                "genres": "Crime|Drama",
-                "rating": 8.9,
-                "overview": "The lives of two mob hitmen, a boxer, and a pair of diner bandits intertwine."
-            },
-            {
-                "title": "Forrest Gump",
-                "movie_id": 13,
-                "genres": "Drama|Romance",
-                "rating": 8.8,
-                "overview": "The presidencies of Kennedy and Johnson, the events of Vietnam."
-            },
-            {
-                "title": "The Godfather",
-                "movie_id": 238,
-                "genres": "Crime|Drama",
-                "rating": 9.2,
-                "overview": "The aging patriarch of an organized crime dynasty transfers control to his son."
-            },
-            {
-                "title": "The Shawshank Redemption",
-                "movie_id": 278,
-                "genres": "Drama",
-                "rating": 9.3,
-                "overview": "Two imprisoned men bond over a number of years."
-            },
-            {
-                "title": "Fight Club",
-                "movie_id": 550,
-                "genres": "Drama",
-                "rating": 8.8,
-                "overview": "An insomniac office worker and a devil-may-care soapmaker form an underground fight club."
-            },
-            {
-                "title": "The Matrix",
-                "movie_id": 603,
-                "genres": "Action|Sci-Fi",
-                "rating": 8.7,
-                "overview": "A computer hacker learns about the true nature of his reality."
-            },
-            {
-                "title": "Interstellar",
-                "movie_id": 157336,
-                "genres": "Adventure|Drama|Sci-Fi",
-                "rating": 8.6,
-                "overview": "A team of explorers travel through a wormhole in space."
-            },
-            {
-                "title": "Parasite",
-                "movie_id": 496243,
-                "genres": "Comedy|Drama|Thriller",
-                "rating": 8.6,
-                "overview": "A poor family schemes to become employed by a wealthy family."
-            }
-        ]
-        
-        df = pd.DataFrame(sample_movies)
-        df.to_csv('data/movies.csv', index=False)
-        print(f"Created data/movies.csv with {len(df)} movies")
-    
-    # 2. Create similarity.pkl if it doesn't exist
-    if not os.path.exists('models/similarity.pkl'):
-        print("Creating similarity.pkl...")
-        
-        # Create a simple similarity matrix (10x10 for our sample movies)
-        # In reality, this should be computed from your actual data
-        np.random.seed(42)
-        similarity_matrix = np.random.rand(10, 10)
-        
-        # Make diagonal = 1 (movies are perfectly similar to themselves)
-        np.fill_diagonal(similarity_matrix, 1)
-        
-        # Make it symmetric
-        similarity_matrix = (similarity_matrix + similarity_matrix.T) / 2
-        
-        with open('models/similarity.pkl', 'wb') as f:
-            pickle.dump(similarity_matrix, f)
-        print("Created models/similarity.pkl")
-    
-    # 3. Create SQLite database
-    if not os.path.exists('data/movies.db'):
-        print("Creating SQLite database...")
-        create_database()
-    
-    print("✅ All required files created successfully!")
-
-def create_database():
-    """Create SQLite database with movies table"""
-    conn = sqlite3.connect('data/movies.db')
-    cursor = conn.cursor()
-    
-    # Create movies table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS movies (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        movie_id INTEGER,
-        genres TEXT,
-        rating REAL,
-        overview TEXT,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create user interactions table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_interactions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        movie_title TEXT,
-        action TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    ''')
-    
-    # Create users table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        role TEXT DEFAULT 'user',
-        is_active INTEGER DEFAULT 1,
-        is_blocked INTEGER DEFAULT 0,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        last_login DATETIME
-    )
-    ''')
-    
-    # Create comments/reviews table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS comments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        movie_title TEXT,
-        comment_text TEXT NOT NULL,
-        rating REAL,
-        is_approved INTEGER DEFAULT 1,
-        is_flagged INTEGER DEFAULT 0,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    ''')
-    
-    # Create admin actions log
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS admin_actions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        admin_id INTEGER,
-        action_type TEXT,
-        target_type TEXT,
-        target_id INTEGER,
-        details TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (admin_id) REFERENCES users(id)
-    )
-    ''')
-    
-    # Insert default admin user (username: admin, password: admin123)
-    # In production, use proper password hashing
-    admin_password_hash = hashlib.sha256("admin123".encode()).hexdigest()
-    cursor.execute('''
-        INSERT OR IGNORE INTO users (username, email, password_hash, role, is_active)
-        VALUES (?, ?, ?, ?, ?)
-    ''', ("admin", "admin@movieapp.com", admin_password_hash, "admin", 1))
-    
-    # Insert sample data from movies.csv
-    if os.path.exists('data/movies.csv'):
-        df = pd.read_csv('data/movies.csv')
-        for _, row in df.iterrows():
-            cursor.execute('''
-                INSERT OR IGNORE INTO movies (title, movie_id, genres, rating, overview)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (row['title'], row['movie_id'], row['genres'], row['rating'], row['overview']))
-    
-    conn.commit()
-    conn.close()
-    print("Created data/movies.db")
+from bootstrap import CF_MODEL_DIR, LEGACY_SIMILARITY_PATH, MODEL_DIR, create_required_files
+from cache import ResultCache
+from posters import PLACEHOLDER_URL, PosterCache, PosterResolver, PosterWarmer
+from profiles import ProfileCache
+from ranking import (CANDIDATE_FACTOR, MIN_CANDIDATES, deployment_weights, hybrid_rank, is_hybrid,
+                     mmr_rerank, parse_weights, popularity_signal, rating_signal, scores_at)
+from serving import SnapshotManager, load_cf_model, load_popularity, load_snapshot
+from tmdb import DEFAULT_BASE_URL, TMDBClient
 
 # ============================================
 # INITIALIZE APPLICATION
@@ -235,18 +30,81 @@ def create_database():
 # Create files first
 create_required_files()
 
-# Now load the data
-movies_df = pd.read_csv('data/movies.csv')
-print(f"✅ Loaded {len(movies_df)} movies from data/movies.csv")
+# Now load the data and models as one immutable snapshot
+# (prefers the memory-mapped model built by build_model.py)
+SNAPSHOT_PATHS = {
+    "catalog_path": 'data/movies.csv',
+    "model_dir": MODEL_DIR,
+    "cf_model_dir": CF_MODEL_DIR,
+    "legacy_path": LEGACY_SIMILARITY_PATH,
+}
+serving = SnapshotManager(load_snapshot(**SNAPSHOT_PATHS, strict=False), SNAPSHOT_PATHS)
+
+startup_snapshot = serving.current
+print(f"✅ Loaded {len(startup_snapshot.movies_df)} movies from data/movies.csv")
+print(f"✅ Loaded {startup_snapshot.similarity_model.kind} similarity model: "
+      f"{startup_snapshot.similarity_model.shape}")
+if startup_snapshot.cf_model is not None:
+    print(f"✅ Loaded collaborative filtering model: {startup_snapshot.cf_model.shape}")
 
-# Load similarity matrix
-try:
-    with open('models/similarity.pkl', 'rb') as f:
-        similarity_matrix = pickle.load(f)
-    print(f"✅ Loaded similarity matrix: {similarity_matrix.shape}")
-except:
-    print("⚠️ Could not load similarity.pkl, creating default...")
-    similarity_matrix = np.eye(len(movies_df))  # Identity matrix as fallback
+# Hot-swap the snapshot when model or catalog files change (seconds between checks, 0 = off)
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "0"))
+if MODEL_WATCH_INTERVAL > 0:
+    serving.watch(MODEL_WATCH_INTERVAL)
+    print(f"👀 Watching {MODEL_DIR}, {CF_MODEL_DIR} and data/movies.csv every {MODEL_WATCH_INTERVAL:g}s")
+
+# Default hybrid ranking weights (RANKING_WEIGHTS="content:1,rating:0.2,...")
+ranking_weights = deployment_weights()
+
+# Cached /recommend responses, valid for one snapshot version
+result_cache = ResultCache(max_entries=2048, current_version=lambda: serving.current.version)
+
+def write_catalog(movies_df, path):
+    """Replace the catalog file atomically, so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    movies_df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def upsert_catalog_movie(movie, row=None):
+    """Add a movie to (row=None) or update it in the catalog and the content model.
+
+    The movie's feature vector is scored against the existing catalog and
+    patched into a copy of the loaded model, so it is recommendable without
+    an offline rebuild. The catalog file is rewritten as well: it is what
+    build_model.py and every reload read, so the movie survives restarts
+    (the model on disk is caught up at load time) and the next build.
+    """
+    columns = ['title', 'movie_id', 'genres', 'rating', 'overview']
+    record = {column: movie.get(column) for column in columns}
+    
+    with serving.lock:
+        snapshot = serving.current
+        movies_df, model = snapshot.movies_df, snapshot.similarity_model
+        if row is None:
+            row = len(movies_df)
+        
+        if snapshot.featurizer is not None and model.supports_updates and row <= model.n_items:
+            features = snapshot.featurizer.transform_one(record['overview'] or "", record['genres'] or "")
+            # A patched copy: requests still reading the current snapshot keep the old model
+            model = model.set_item(row, features)
+        else:
+            print(f"⚠️ {model.kind} model cannot be updated in place; '{record['title']}' keeps its "
+                  f"previous neighbors (none if new) until build_model.py content rebuilds the model")
+        
+        # Publish the new catalog only after the model knows about the row
+        if row == len(movies_df):
+            updated_df = pd.concat([movies_df, pd.DataFrame([record])], ignore_index=True)
+        else:
+            updated_df = movies_df.copy()
+            for column, value in record.items():
+                if column in updated_df.columns:
+                    updated_df.at[row, column] = value
+        write_catalog(updated_df, SNAPSHOT_PATHS['catalog_path'])
+        serving.swap(snapshot.replace(movies_df=updated_df, similarity_model=model, source=serving.signature()),
+                     keep_history=False)
+
+# Cached taste profiles for personalized recommendations
+profile_cache = ProfileCache()
 
 # Initialize FastAPI
 app = FastAPI(title="Movie Recommendation API")
@@ -262,6 +120,45 @@ app.add_middleware(
 # TMDB API
 TMDB_API_KEY = "8265bd1679663a7ea12ac168da84d2e8"
 
+# Poster URLs cached in data/movies.db (TTLs in seconds: found, no poster, failed lookup)
+poster_cache = PosterCache(
+    'data/movies.db',
+    ttl=float(os.environ.get("POSTER_TTL", 7 * 86400)),
+    missing_ttl=float(os.environ.get("POSTER_MISSING_TTL", 86400)),
+    error_ttl=float(os.environ.get("POSTER_ERROR_TTL", 300)),
+    max_entries=int(os.environ.get("POSTER_CACHE_SIZE", 10000)),
+)
+
+# Pooled TMDB connections; at most TMDB_MAX_CONCURRENCY calls in flight from this process.
+# After TMDB_FAILURE_THRESHOLD failures in a row, lookups fail fast for TMDB_RESET_SECONDS.
+# TMDB_BASE_URL can point at a local stand-in server.
+tmdb_client = TMDBClient(
+    TMDB_API_KEY,
+    base_url=os.environ.get("TMDB_BASE_URL", DEFAULT_BASE_URL),
+    timeout=float(os.environ.get("TMDB_TIMEOUT", 5)),
+    max_concurrency=int(os.environ.get("TMDB_MAX_CONCURRENCY", 8)),
+    failure_threshold=int(os.environ.get("TMDB_FAILURE_THRESHOLD", 5)),
+    reset_seconds=float(os.environ.get("TMDB_RESET_SECONDS", 30)),
+)
+# Background prefetches get a quarter of the TMDB slots, so requests waiting for posters always find free ones
+poster_resolver = PosterResolver(poster_cache, tmdb_client.poster, max_workers=tmdb_client.max_concurrency,
+                                 prefetch_workers=max(1, tmdb_client.max_concurrency // 4))
+
+# Largest movie_ids list accepted by POST /posters, and most results (seeds x k) per POST /recommend/batch
+MAX_POSTER_BATCH = 100
+
+def poster_warm_order():
+    """Catalog movie_ids in /popular order (highest rated first)"""
+    movies_df = serving.current.movies_df
+    return [int(movie_id) for movie_id in movies_df.sort_values('rating', ascending=False)['movie_id'].dropna()]
+
+# Pre-resolve posters in the background (POSTER_WARM_RATE lookups per second, 0 = off).
+# With POSTER_WARM_LOCK (set by serve.py) only the worker holding that lock file warms.
+poster_warmer = PosterWarmer(poster_cache, tmdb_client.poster, poster_warm_order,
+                             rate=float(os.environ.get("POSTER_WARM_RATE", 2)),
+                             lock_path=os.environ.get("POSTER_WARM_LOCK"))
+poster_warmer.start()
+
 # Database connection
 def get_db_connection():
     conn = sqlite3.connect('data/movies.db')
@@ -391,12 +288,30 @@ ensure_admin_user()
 # Pydantic models
 class MovieResponse(BaseModel):
     title: str
+    movie_id: Optional[int] = None
     poster: Optional[str] = None
     similarity: Optional[float] = None
     rating: Optional[float] = None
     genres: Optional[str] = None
     overview: Optional[str] = None
 
+class BatchRecommendRequest(BaseModel):
+    titles: List[str] = []
+    movie_ids: List[int] = []
+    k: int = 5
+
+class PostersRequest(BaseModel):
+    movie_ids: List[int]
+
+class SeedMovie(BaseModel):
+    title: Optional[str] = None
+    movie_id: Optional[int] = None
+    weight: float = 1.0
+
+class BlendRecommendRequest(BaseModel):
+    seeds: List[SeedMovie]
+    k: int = 5
+
 class LogRequest(BaseModel):
     movie_title: str
     action: str
@@ -492,11 +407,14 @@ def read_root():
     """Root endpoint - health check"""
     return {
         "message": "Movie Recommendation API",
-        "movies_count": len(movies_df),
+        "movies_count": len(serving.current.movies_df),
         "status": "running",
         "endpoints": {
             "search": "/search/{query}",
             "recommend": "/recommend/{movie_title}",
+            "recommend_batch": "POST /recommend/batch",
+            "recommend_blend": "POST /recommend/blend",
+            "user_recommendations": "/users/{user_id}/recommendations",
             "popular": "/popular",
             "all_movies": "/movies"
         }
@@ -505,71 +423,267 @@ def read_root():
 @app.get("/movies")
 def get_all_movies():
     """Get all movies"""
-    return movies_df.to_dict('records')
+    return serving.current.movies_df.to_dict('records')
 
 @app.get("/search/{query}")
 def search_movies(query: str):
     """Search for movies"""
+    movies_df = serving.current.movies_df
     if query.lower() == "all":
         return movies_df.to_dict('records')
     
     results = movies_df[movies_df['title'].str.contains(query, case=False, na=False)]
     return results.to_dict('records')
 
+def format_recommendation(snapshot, movie_idx, similarity, poster, score=None):
+    """Response entry for one recommended movie (`score` is the hybrid ranking score, if any)"""
+    movie_data = snapshot.movies_df.iloc[movie_idx]
+    entry = {
+        "title": movie_data['title'],
+        "movie_id": int(movie_data['movie_id']) if pd.notna(movie_data['movie_id']) else None,
+        "poster": poster,
+        "similarity": float(similarity),
+        "rating": float(movie_data['rating']) if pd.notna(movie_data['rating']) else None,
+        "genres": movie_data['genres'],
+        "overview": movie_data['overview']
+    }
+    if score is not None:
+        entry["score"] = float(score)
+    return entry
+
+def model_row(snapshot, title=None, movie_id=None):
+    """Catalog row of a movie the model can recommend for, or None"""
+    row = snapshot.catalog_index.row(title=title, movie_id=movie_id)
+    return row if row is not None and row < snapshot.similarity_model.n_items else None
+
+def row_posters(snapshot, movie_indices, cached_only=False):
+    """Posters for catalog rows, cache misses fetched concurrently (movies without a TMDB id get the placeholder).
+
+    With `cached_only`, uncached posters are None and are fetched in the background instead.
+    """
+    movie_ids = [snapshot.movies_df.iloc[movie_idx]['movie_id'] for movie_idx in movie_indices]
+    tmdb_ids = [int(movie_id) for movie_id in movie_ids if pd.notna(movie_id)]
+    poster_warmer.record(tmdb_ids)
+    if cached_only:
+        posters = poster_resolver.cached(tmdb_ids)
+        poster_resolver.prefetch([movie_id for movie_id in tmdb_ids if movie_id not in posters])
+    else:
+        posters = poster_resolver.resolve_many(tmdb_ids)
+    return [posters.get(int(movie_id)) if pd.notna(movie_id) else PLACEHOLDER_URL for movie_id in movie_ids]
+
+def ranked_neighbors(snapshot, active_model, idx, k, offset, allowed, weights, min_results=None):
+    """Top-k (indices, similarities, scores) for movie `idx`, re-ranked by the hybrid `weights`.
+
+    With only the content weight set this is the model's own neighbor list
+    and the scores are the similarities. Otherwise CANDIDATE_FACTOR times
+    more candidates are generated (plus the CF neighbors when CF is
+    weighted) and scored by the weighted signals; similarities stay the
+    candidate model's own. A filtered request only falls back to scanning
+    the catalog when fewer than `min_results` (default `offset + k`)
+    candidates survive the filter, not whenever the extra candidates do.
+    """
+    limit = len(snapshot.movies_df)
+    cf_model = snapshot.cf_model
+    min_results = min_results or offset + k
+    if not is_hybrid(weights):
+        indices, scores = active_model.neighbors(idx, k, offset=offset, limit=limit, allowed=allowed,
+                                                 min_results=min_results)
+        return indices, scores, scores
+    
+    n_candidates = max(CANDIDATE_FACTOR * (offset + k), MIN_CANDIDATES)
+    indices, scores = active_model.neighbors(idx, n_candidates, limit=limit, allowed=allowed,
+                                             min_results=min_results)
+    candidates = indices
+    cf_indices = cf_scores = np.empty(0)
+    if weights['cf'] and cf_model is not None and idx < cf_model.n_items:
+        cf_indices, cf_scores = cf_model.neighbors(idx, n_candidates, limit=limit, allowed=allowed,
+                                                   min_results=min_results)
+        candidates = np.union1d(indices, cf_indices)
+    
+    signals = {"content": scores_at(indices, scores, candidates)}
+    if weights['rating']:
+        signals['rating'] = rating_signal(snapshot.catalog_index.ratings, candidates)
+    if weights['popularity']:
+        signals['popularity'] = popularity_signal(snapshot.popularity, candidates)
+    if weights['cf']:
+        signals['cf'] = scores_at(cf_indices, cf_scores, candidates)
+    top_indices, top_scores = hybrid_rank(candidates, signals, weights, k, offset=offset)
+    return top_indices, scores_at(indices, scores, top_indices), top_scores
+
+def diversified_neighbors(snapshot, active_model, idx, k, offset, allowed, weights, mmr_lambda):
+    """Top-k (indices, similarities, scores) for movie `idx` re-ranked by maximal marginal relevance.
+
+    Redundancy between candidates is read from the content model (the same
+    neighbor lists, embeddings or matrix used for recommending).
+    """
+    n_candidates = max(CANDIDATE_FACTOR * (offset + k), MIN_CANDIDATES)
+    candidates, similarities, relevance = ranked_neighbors(snapshot, active_model, idx, n_candidates, 0, allowed,
+                                                           weights, min_results=offset + k)
+    if not len(candidates):
+        return candidates, similarities, relevance
+    similarity_model = snapshot.similarity_model
+    diversity_model = similarity_model if candidates.max() < similarity_model.n_items else active_model
+    top_indices, top_scores = mmr_rerank(candidates, relevance, diversity_model.pairwise(candidates),
+                                         offset + k, mmr_lambda)
+    top_indices, top_scores = top_indices[offset:], top_scores[offset:]
+    return top_indices, scores_at(candidates, similarities, top_indices), top_scores
+
 @app.get("/recommend/{movie_title}")
-def recommend_movies(movie_title: str):
-    """Get recommendations for a movie"""
+def recommend_movies(movie_title: str, k: int = 5, offset: int = 0,
+                     genres: Optional[str] = None, min_rating: Optional[float] = None,
+                     model: str = "content", weights: Optional[str] = None,
+                     mmr_lambda: Optional[float] = None, poster_mode: str = "fetch"):
+    """Get recommendations for a movie, optionally only in some genres (comma-separated) or above a rating.
+
+    `model` is "content" (overview/genre similarity) or "cf" (users who liked this also liked).
+    `weights` overrides the deployment's hybrid ranking weights, e.g. "content:1,rating:0.3,cf:0.5".
+    `mmr_lambda` in [0, 1] turns on diversity re-ranking (1 = relevance only, lower = more diverse).
+    `poster_mode` "cache" returns at once with cached posters only (null where not cached yet,
+    fetch them with POST /posters); "fetch" waits for TMDB.
+    """
     try:
+        # Everything below reads this one snapshot, even if a new one is swapped in meanwhile
+        snapshot = serving.current
+        catalog_index = snapshot.catalog_index
+        models = {"content": snapshot.similarity_model, "cf": snapshot.cf_model}
+        if model not in models:
+            return {"error": f"Unknown model '{model}', expected one of {sorted(models)}"}
+        active_model = models[model]
+        if active_model is None:
+            return {"error": "Collaborative filtering model has not been built yet"}
+        
         # Find movie index
-        if movie_title not in movies_df['title'].values:
-            return {"error": f"Movie '{movie_title}' not found. Available movies: {list(movies_df['title'].values)}"}
+        idx = catalog_index.row(title=movie_title)
+        if idx is None:
+            return {"error": f"Movie '{movie_title}' not found", "suggestions": catalog_index.suggest(movie_title)}
+        
+        if k < 1 or offset < 0:
+            return {"error": "k must be at least 1 and offset must not be negative"}
         
-        idx = movies_df[movies_df['title'] == movie_title].index[0]
+        if mmr_lambda is not None and not 0 <= mmr_lambda <= 1:
+            return {"error": "mmr_lambda must be between 0 and 1"}
         
-        # Get similarity scores
-        sim_scores = list(enumerate(similarity_matrix[idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)[1:6]  # Top 5 excluding self
+        if poster_mode not in ("fetch", "cache"):
+            return {"error": "poster_mode must be 'fetch' or 'cache'"}
+        cached_posters = poster_mode == "cache"
         
-        # Get recommended movies
-        recommendations = []
-        for i in sim_scores:
-            movie_idx = i[0]
-            if movie_idx < len(movies_df):
-                movie_data = movies_df.iloc[movie_idx]
-                
-                # Get poster from TMDB
-                poster = get_movie_poster(int(movie_data['movie_id']))
-                
-                recommendations.append({
-                    "title": movie_data['title'],
-                    "poster": poster,
-                    "similarity": float(i[1]),
-                    "rating": float(movie_data['rating']) if pd.notna(movie_data['rating']) else None,
-                    "genres": movie_data['genres'],
-                    "overview": movie_data['overview']
-                })
+        if idx >= active_model.n_items:
+            return {"error": f"Movie '{movie_title}' is not in the recommendation model yet"}
         
-        return recommendations
+        genre_filter = tuple(sorted({genre.strip() for genre in genres.split(',') if genre.strip()})) if genres else ()
+        
+        try:
+            request_weights = parse_weights(weights, ranking_weights)
+        except ValueError as e:
+            return {"error": str(e)}
+        
+        # Repeated requests reuse the ranking; posters have their own cache and TTLs
+        cache_key = (model, idx, k, offset, genre_filter, min_rating, tuple(sorted(request_weights.items())),
+                     mmr_lambda)
+        ranking = result_cache.get(cache_key, snapshot.version)
+        if ranking is None:
+            # Precomputed genre bitmasks / ratings give a boolean mask over the catalog
+            try:
+                allowed = catalog_index.filter_mask(genre_filter, min_rating)
+            except KeyError as e:
+                return {"error": f"Unknown genre {e}", "genres": sorted(catalog_index.genre_bits)}
+            
+            # Get top-k neighbors (only rows that exist in the catalog can be recommended)
+            if mmr_lambda is None:
+                ranking = ranked_neighbors(snapshot, active_model, idx, k, offset, allowed, request_weights)
+            else:
+                ranking = diversified_neighbors(snapshot, active_model, idx, k, offset, allowed,
+                                                request_weights, mmr_lambda)
+            result_cache.put(cache_key, snapshot.version, ranking)
+        top_indices, top_similarities, top_scores = ranking
+        
+        # Get recommended movies, with all their posters resolved in one concurrent pass
+        posters = row_posters(snapshot, top_indices, cached_only=cached_posters)
+        return [format_recommendation(snapshot, movie_idx, similarity, poster, score=score)
+                for movie_idx, similarity, score, poster in zip(top_indices, top_similarities, top_scores, posters)]
     
     except Exception as e:
         return {"error": str(e), "traceback": str(e.__traceback__)}
 
-def get_movie_poster(movie_id: int):
-    """Get movie poster URL from TMDB"""
-    try:
-        url = f"https://api.themoviedb.org/3/movie/{movie_id}?api_key={TMDB_API_KEY}"
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'poster_path' in data and data['poster_path']:
-                return f"https://image.tmdb.org/t/p/w500{data['poster_path']}"
-        
-        return "https://via.placeholder.com/500x750?text=Poster+Not+Available"
+@app.post("/recommend/batch")
+def recommend_batch(request: BatchRecommendRequest):
+    """Get recommendations for many movies at once, keyed by the requested title or movie_id"""
+    if request.k < 1:
+        return {"error": "k must be at least 1"}
+    # Every result's poster is fetched before responding, so cap the total like POST /posters
+    n_seeds = len(request.titles) + len(request.movie_ids)
+    if n_seeds * request.k > MAX_POSTER_BATCH:
+        return {"error": f"At most {MAX_POSTER_BATCH} results per request "
+                         f"(got {n_seeds} movies x k={request.k})"}
+    
+    snapshot = serving.current
+    
+    # Resolve inputs to catalog rows
+    keys, rows, not_found, suggestions = [], [], [], {}
+    for title in request.titles:
+        row = model_row(snapshot, title=title)
+        if row is not None:
+            keys.append(title)
+            rows.append(row)
+        else:
+            not_found.append(title)
+            suggestions[title] = snapshot.catalog_index.suggest(title)
+    for movie_id in request.movie_ids:
+        row = model_row(snapshot, movie_id=movie_id)
+        if row is not None:
+            keys.append(str(movie_id))
+            rows.append(row)
+        else:
+            not_found.append(str(movie_id))
     
-    except Exception as e:
-        print(f"TMDB API error: {e}")
-        return "https://via.placeholder.com/500x750?text=Poster+Error"
+    # Score every seed in one batched pass
+    neighbors = (snapshot.similarity_model.batch_neighbors(rows, request.k, limit=len(snapshot.movies_df))
+                 if rows else [])
+    
+    # Fetch each poster once, however many results it appears in
+    unique_rows = np.unique(np.concatenate([indices for indices, _ in neighbors])) if neighbors else []
+    posters = dict(zip((int(movie_idx) for movie_idx in unique_rows), row_posters(snapshot, unique_rows)))
+    
+    results = {}
+    for key, (indices, scores) in zip(keys, neighbors):
+        results[key] = [format_recommendation(snapshot, movie_idx, score, posters[int(movie_idx)])
+                        for movie_idx, score in zip(indices, scores)]
+    
+    return {"results": results, "not_found": not_found, "suggestions": suggestions}
+
+@app.post("/recommend/blend")
+def recommend_blend(request: BlendRecommendRequest):
+    """Get "more like these" recommendations for several weighted seed movies"""
+    if request.k < 1:
+        return {"error": "k must be at least 1"}
+    
+    snapshot = serving.current
+    rows, weights, not_found, suggestions = [], [], [], {}
+    for seed in request.seeds:
+        row = model_row(snapshot, title=seed.title, movie_id=seed.movie_id)
+        if row is None:
+            not_found.append(seed.title if seed.title is not None else str(seed.movie_id))
+            if seed.title is not None:
+                suggestions[seed.title] = snapshot.catalog_index.suggest(seed.title)
+            continue
+        rows.append(row)
+        weights.append(seed.weight)
+    
+    if not rows:
+        return {"error": "None of the seed movies were found", "not_found": not_found,
+                "suggestions": suggestions}
+    
+    # Blend all seed rows in one vectorized step, seeds excluded
+    top_indices, top_scores = snapshot.similarity_model.blend(rows, weights, request.k,
+                                                              limit=len(snapshot.movies_df))
+    
+    # The blend sums the seeds' scores: report it as `score` and the weighted mean as `similarity`
+    total_weight = float(np.abs(weights).sum()) or 1.0
+    posters = row_posters(snapshot, top_indices)
+    recommendations = [format_recommendation(snapshot, movie_idx, score / total_weight, poster, score=score)
+                       for movie_idx, score, poster in zip(top_indices, top_scores, posters)]
+    
+    return {"recommendations": recommendations, "not_found": not_found, "suggestions": suggestions}
 
 @app.post("/log_interaction")
 def log_interaction(request: LogRequest):
@@ -602,6 +716,14 @@ def log_interaction(request: LogRequest):
             )
         
         conn.commit()
+        
+        # Keep the user's cached profile current without rescanning their history
+        if request.user_id and request.action == 'like':
+            snapshot = serving.current
+            row = model_row(snapshot, title=request.movie_title)
+            if row is not None:
+                profile_cache.record_like(request.user_id, row, snapshot.similarity_model)
+        
         return {"status": "success", "message": "Interaction logged"}
     
     except sqlite3.IntegrityError as e:
@@ -616,6 +738,39 @@ def log_interaction(request: LogRequest):
         if conn:
             conn.close()
 
+@app.get("/users/{user_id}/recommendations")
+def recommend_for_user(user_id: int, k: int = 10):
+    """Get personalized recommendations from the movies a user has liked"""
+    if k < 1:
+        return {"error": "k must be at least 1"}
+    
+    snapshot = serving.current
+    
+    def load_liked_rows():
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT DISTINCT movie_title FROM user_interactions WHERE user_id = ? AND action = 'like'",
+            (user_id,)
+        )
+        liked_titles = [row['movie_title'] for row in cursor.fetchall()]
+        conn.close()
+        
+        rows = [model_row(snapshot, title=title) for title in liked_titles]
+        return [row for row in rows if row is not None]
+    
+    profile = profile_cache.get(user_id, snapshot.similarity_model, load_liked_rows)
+    if not profile.liked_rows:
+        return {"error": f"User {user_id} has not liked any movies yet"}
+    
+    n_liked = len(profile.liked_rows)
+    top_indices, top_scores = profile.recommend(k, limit=len(snapshot.movies_df))
+    
+    # Profiles sum over the liked movies: report that as `score` and the mean as `similarity`
+    posters = row_posters(snapshot, top_indices)
+    return [format_recommendation(snapshot, movie_idx, score / n_liked, poster, score=score)
+            for movie_idx, score, poster in zip(top_indices, top_scores, posters)]
+
 @app.get("/user/{user_id}/liked/{movie_title}")
 def check_user_liked(user_id: int, movie_title: str):
     """Check if user has liked a movie"""
@@ -631,10 +786,18 @@ def check_user_liked(user_id: int, movie_title: str):
     
     return {"liked": liked is not None}
 
+@app.post("/posters")
+def get_posters(request: PostersRequest):
+    """Resolve poster URLs for many movie_ids in one call (cached ones immediately, the rest concurrently)"""
+    if len(request.movie_ids) > MAX_POSTER_BATCH:
+        return {"error": f"At most {MAX_POSTER_BATCH} movie_ids per request"}
+    posters = poster_resolver.resolve_many(request.movie_ids)
+    return {"posters": {str(movie_id): posters[movie_id] for movie_id in request.movie_ids}}
+
 @app.get("/popular")
 def get_popular_movies(limit: int = 10):
     """Get popular movies (highest rated)"""
-    sorted_movies = movies_df.sort_values('rating', ascending=False).head(limit)
+    sorted_movies = serving.current.movies_df.sort_values('rating', ascending=False).head(limit)
     return sorted_movies.to_dict('records')
 
 @app.get("/stats")
@@ -648,11 +811,17 @@ def get_stats():
     
     conn.close()
     
+    snapshot = serving.current
     return {
-        "total_movies": len(movies_df),
+        "total_movies": len(snapshot.movies_df),
         "interactions_logged": interactions_count,
-        "similarity_matrix_shape": similarity_matrix.shape,
-        "sample_movies": list(movies_df['title'].head(5))
+        "similarity_model": snapshot.similarity_model.kind,
+        "similarity_matrix_shape": snapshot.similarity_model.shape,
+        "cf_model_shape": snapshot.cf_model.shape if snapshot.cf_model is not None else None,
+        "model_version": snapshot.version,
+        "result_cache": result_cache.stats(),
+        "poster_cache": poster_cache.stats(),
+        "sample_movies": list(snapshot.movies_df['title'].head(5))
     }
 
 # ============================================
@@ -955,9 +1124,8 @@ def create_movie(movie_data: MovieCreate, admin: dict = Depends(get_admin_user))
     
     conn.close()
     
-    # Reload movies_df
-    global movies_df
-    movies_df = pd.read_csv('data/movies.csv')
+    # Make the new movie recommendable right away
+    upsert_catalog_movie(movie_data.dict())
     
     return {"status": "success", "message": "Movie created successfully", "movie_id": movie_id}
 
@@ -1005,6 +1173,12 @@ def update_movie(movie_id: int, movie_update: MovieUpdate, admin: dict = Depends
             VALUES (?, ?, ?, ?, ?)
         ''', (admin['id'], 'update_movie', 'movie', movie_id, f"Updated movie {movie_id}"))
         conn.commit()
+        
+        # Refresh the movie's catalog entry and neighbors
+        catalog_index = serving.current.catalog_index
+        row = catalog_index.by_movie_id.get(movie['movie_id'], catalog_index.by_title.get(movie['title']))
+        if row is not None:
+            upsert_catalog_movie({**dict(movie), **movie_update.dict(exclude_none=True)}, row=row)
     
     conn.close()
     return {"status": "success", "message": "Movie updated successfully"}
@@ -1034,10 +1208,91 @@ def delete_movie(movie_id: int, admin: dict = Depends(get_admin_user)):
     conn.close()
     return {"status": "success", "message": "Movie deleted successfully"}
 
+# ============================================
+# ADMIN ENDPOINTS - MODELS
+# ============================================
+
+# State of the background collaborative filtering build
+cf_build_status = {"running": False, "started_at": None, "finished_at": None, "error": None}
+cf_build_lock = threading.Lock()
+
+def run_cf_build():
+    """Rebuild the CF model from user_interactions in a subprocess, then publish it"""
+    result = subprocess.run([sys.executable, 'build_model.py', 'cf', '--output', CF_MODEL_DIR],
+                            capture_output=True, text=True)
+    error = None
+    if result.returncode == 0:
+        with serving.lock:
+            snapshot = serving.current
+            # The CF build reads the catalog file, so check the model against it
+            cf_model = load_cf_model(pd.read_csv(SNAPSHOT_PATHS['catalog_path']), CF_MODEL_DIR)
+            if cf_model is not None:
+                serving.swap(snapshot.replace(cf_model=cf_model, popularity=load_popularity(CF_MODEL_DIR)))
+                print(f"✅ Rebuilt collaborative filtering model: {cf_model.shape}")
+    else:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "build failed"
+        print(f"⚠️ Collaborative filtering build failed: {error}")
+    
+    with cf_build_lock:
+        cf_build_status.update(running=False, finished_at=datetime.now().isoformat(timespec="seconds"),
+                               error=error)
+
+@app.post("/admin/models/cf/rebuild")
+def rebuild_cf_model(admin: dict = Depends(get_admin_user)):
+    """Start a background rebuild of the collaborative filtering model (Admin only)"""
+    with cf_build_lock:
+        if cf_build_status["running"]:
+            return {"status": "running", "message": "A collaborative filtering build is already running"}
+        cf_build_status.update(running=True, started_at=datetime.now().isoformat(timespec="seconds"),
+                               error=None)
+    threading.Thread(target=run_cf_build, daemon=True).start()
+    return {"status": "started", "message": "Collaborative filtering build started"}
+
+@app.get("/admin/models/cf")
+def get_cf_model_status(admin: dict = Depends(get_admin_user)):
+    """Collaborative filtering model and build status (Admin only)"""
+    with cf_build_lock:
+        build_status = dict(cf_build_status)
+    cf_model = serving.current.cf_model
+    build_status["model_shape"] = cf_model.shape if cf_model is not None else None
+    return build_status
+
+@app.get("/admin/models")
+def get_model_status(admin: dict = Depends(get_admin_user)):
+    """Serving snapshot, rollback history and last reload (Admin only)"""
+    return {
+        "current": serving.current.describe(),
+        "history": serving.history(),
+        "last_reload": serving.last_reload,
+        "watch_interval": MODEL_WATCH_INTERVAL,
+    }
+
+@app.post("/admin/models/reload")
+def reload_models(admin: dict = Depends(get_admin_user)):
+    """Load the catalog and models from disk in the background and swap them in (Admin only)"""
+    if not serving.reload_async():
+        return {"status": "running", "message": "A model reload is already running"}
+    return {"status": "started", "message": "Model reload started; check GET /admin/models"}
+
+@app.post("/admin/models/rollback")
+def rollback_models(admin: dict = Depends(get_admin_user)):
+    """Swap the previous catalog/model snapshot back in (Admin only)"""
+    snapshot = serving.rollback()
+    if snapshot is None:
+        raise HTTPException(status_code=409, detail="No previous model version to roll back to")
+    return {"status": "success", "message": f"Rolled back to model version {snapshot.version}",
+            "current": snapshot.describe()}
+
 # ============================================
 # ADMIN ENDPOINTS - COMMENT MODERATION
 # ============================================
 
+@app.get("/admin/posters")
+def get_poster_status(admin: dict = Depends(get_admin_user)):
+    """Poster cache hit rates, TMDB client health and background warmer progress"""
+    return {"cache": poster_cache.stats(), "tmdb": tmdb_client.stats(), "resolver": poster_resolver.stats(),
+            "warmer": poster_warmer.stats()}
+
 @app.get("/admin/comments")
 def get_all_comments(admin: dict = Depends(get_admin_user), flagged_only: bool = False):
     """Get all comments (Admin only)"""
@@ -1263,7 +1518,7 @@ if __name__ == "__main__":
     print("\n" + "="*50)
     print("🎬 MOVIE RECOMMENDATION BACKEND")
     print("="*50)
-    print(f"📊 Total movies: {len(movies_df)}")
+    print(f"📊 Total movies: {len(serving.current.movies_df)}")
     print(f"🔗 API URL: http://localhost:8000")
     print(f"📝 Available endpoints:")
     print(f"   • http://localhost:8000/ (Health check)")
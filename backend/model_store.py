@@ -0,0 +1,183 @@
+"""Versioned, pickle-free on-disk format for recommendation models.
+
+A model is a directory holding one raw binary file per array plus a small
+``header.json`` describing them:
+
+    models/recommender/
+        header.json        format version, model kind, catalog checksum,
+                           and dtype/shape of every array
+        indptr.bin
+        indices.bin
+        scores.bin
+        row_hashes.bin     optional, one hash per catalog row (see changed_rows)
+
+Arrays are opened with ``np.memmap`` in read-only mode, so loading is
+near-instant, only the rows that requests touch are paged in, and the pages
+are shared between every worker process that maps the same files.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from recommender import DenseSimilarity, EmbeddingModel, NeighborIndex
+
+FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+ROW_HASHES_FILE = "row_hashes.bin"
+
+MODEL_KINDS = {
+    DenseSimilarity.kind: DenseSimilarity,
+    NeighborIndex.kind: NeighborIndex,
+    EmbeddingModel.kind: EmbeddingModel,
+}
+
+
+def _movie_ids(movies_df):
+    """movie_id column as strings, so 155 and 155.0 (read back next to a missing id) match"""
+    return pd.to_numeric(movies_df['movie_id'], errors='coerce').astype('Int64').astype(str)
+
+
+def catalog_checksum(movies_df):
+    """Fingerprint of the catalog row order a model was built against"""
+    digest = hashlib.sha256()
+    for title, movie_id in zip(movies_df['title'], _movie_ids(movies_df)):
+        digest.update(f"{title}\x1f{movie_id}\x1e".encode())
+    return digest.hexdigest()
+
+
+def row_hashes(movies_df):
+    """One uint64 hash per catalog row over the columns a content model is built from"""
+    columns = pd.DataFrame({
+        "title": movies_df['title'].astype(str),
+        "movie_id": _movie_ids(movies_df),
+        "genres": movies_df.get('genres', pd.Series("", index=movies_df.index)).fillna("").astype(str),
+        "overview": movies_df.get('overview', pd.Series("", index=movies_df.index)).fillna("").astype(str),
+    })
+    return pd.util.hash_pandas_object(columns, index=False).to_numpy(dtype=np.uint64)
+
+
+def model_exists(directory):
+    return os.path.exists(os.path.join(directory, HEADER_FILE))
+
+
+def read_header(directory):
+    with open(os.path.join(directory, HEADER_FILE)) as f:
+        return json.load(f)
+
+
+def save_model(model, directory, checksum=None, extras=None, hashes=None):
+    """Write `model` to `directory`, replacing any previous version atomically.
+
+    `extras` maps file names to JSON-serializable objects stored alongside the
+    arrays (e.g. the featurizer vocabulary); read them back with `load_extra`.
+    `hashes` (see `row_hashes`) lets `changed_rows` find catalog rows edited
+    or added after the build.
+    """
+    tmp_directory = directory.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    for filename, data in (extras or {}).items():
+        with open(os.path.join(tmp_directory, filename), "w") as f:
+            json.dump(data, f)
+
+    arrays = {}
+    for name, array in model.to_arrays().items():
+        array = np.ascontiguousarray(array)
+        filename = f"{name}.bin"
+        array.tofile(os.path.join(tmp_directory, filename))
+        arrays[name] = {"file": filename, "dtype": array.dtype.str, "shape": list(array.shape)}
+
+    row_hashes_spec = None
+    if hashes is not None:
+        hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+        hashes.tofile(os.path.join(tmp_directory, ROW_HASHES_FILE))
+        row_hashes_spec = {"file": ROW_HASHES_FILE, "shape": list(hashes.shape)}
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "kind": model.kind,
+        "dtype": model.dtype,
+        "n_items": model.n_items,
+        "catalog_checksum": checksum,
+        "params": model.params(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "arrays": arrays,
+        "extras": sorted(extras or {}),
+        "row_hashes": row_hashes_spec,
+    }
+    with open(os.path.join(tmp_directory, HEADER_FILE), "w") as f:
+        json.dump(header, f, indent=2)
+
+    # Swap the finished directory in so readers never see a half-written model
+    old_directory = directory.rstrip("/") + ".old"
+    shutil.rmtree(old_directory, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, old_directory)
+    os.rename(tmp_directory, directory)
+    shutil.rmtree(old_directory, ignore_errors=True)
+    return header
+
+
+def load_model(directory, checksum=None):
+    """Memory-map the model stored in `directory`.
+
+    Raises ValueError if the format version is unknown or, when `checksum` is
+    given, if the model was built against a different catalog.
+    """
+    header = read_header(directory)
+
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format version: {header.get('format_version')}")
+    if header.get("kind") not in MODEL_KINDS:
+        raise ValueError(f"Unknown model kind: {header.get('kind')}")
+    if checksum is not None and header.get("catalog_checksum") not in (None, checksum):
+        raise ValueError("Model was built against a different catalog (checksum mismatch)")
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        path = os.path.join(directory, spec["file"])
+        shape = tuple(spec["shape"])
+        if 0 in shape:
+            # np.memmap cannot map empty files
+            arrays[name] = np.empty(shape, dtype=np.dtype(spec["dtype"]))
+        else:
+            arrays[name] = np.memmap(path, dtype=np.dtype(spec["dtype"]), mode="r", shape=shape)
+
+    return MODEL_KINDS[header["kind"]].from_arrays(arrays, header.get("params"))
+
+
+def load_extra(directory, filename):
+    """JSON extra saved with the model, or None if the model has none"""
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def changed_rows(directory, movies_df):
+    """Catalog rows added or edited since the model in `directory` was built.
+
+    Returns None for a model saved without row hashes. Raises ValueError if
+    the catalog has fewer rows than the model (movies were removed).
+    """
+    header = read_header(directory)
+    spec = header.get("row_hashes")
+    if spec is None:
+        return None
+    n_built = spec["shape"][0]
+    if len(movies_df) < n_built:
+        raise ValueError(f"Catalog has {len(movies_df)} movies, fewer than the {n_built} the model was built with")
+
+    current = row_hashes(movies_df)
+    built = (np.fromfile(os.path.join(directory, spec["file"]), dtype=np.uint64) if n_built
+             else np.empty(0, dtype=np.uint64))
+    edited = np.flatnonzero(current[:n_built] != built)
+    return np.concatenate([edited, np.arange(n_built, len(movies_df))])
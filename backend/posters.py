@@ -0,0 +1,322 @@
+"""Poster URL cache: an in-memory LRU in front of a `posters` table in SQLite.
+
+Every lookup result is stored, including movies TMDB has no poster for
+("missing") and lookups that failed ("error"), so a movie costs at most one
+TMDB call per TTL. Each status has its own TTL; failures expire soonest so
+an outage does not stick.
+
+`PosterResolver` answers a whole response's posters at once: cache hits are
+read in one query and the misses are fetched concurrently. `PosterWarmer`
+fills the cache ahead of time in the background.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process warms
+    fcntl = None
+
+PLACEHOLDER_URL = "https://via.placeholder.com/500x750?text=Poster+Not+Available"
+ERROR_URL = "https://via.placeholder.com/500x750?text=Poster+Error"
+
+FOUND, MISSING, ERROR = "found", "missing", "error"
+# Lookup skipped because TMDB is failing (see tmdb.CircuitBreaker); never cached
+UNAVAILABLE = "unavailable"
+
+
+def display_url(url, status):
+    """URL to show for a lookup result (placeholders for missing and failed ones)"""
+    if status == FOUND:
+        return url
+    return PLACEHOLDER_URL if status == MISSING else ERROR_URL
+
+
+class PosterCache:
+    """Thread-safe poster cache persisted in the `posters` table of `db_path`.
+
+    Entries are (url, status, fetched_at). `get_many` leaves out unknown or
+    expired movies, which the caller then fetches and `put`s.
+    """
+
+    def __init__(self, db_path, ttl=7 * 86400, missing_ttl=86400, error_ttl=300, max_entries=10000):
+        self.db_path = db_path
+        self.ttls = {FOUND: ttl, MISSING: missing_ttl, ERROR: error_ttl}
+        self.max_entries = max_entries
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.ensure_table()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def ensure_table(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS posters (
+                movie_id INTEGER PRIMARY KEY,
+                url TEXT,
+                fetched_at REAL NOT NULL,
+                status TEXT NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _fresh(self, entry, now):
+        _, status, fetched_at = entry
+        return now - fetched_at < self.ttls.get(status, 0)
+
+    def _remember(self, movie_id, entry):
+        """Store in the LRU; caller holds the lock"""
+        self._entries[movie_id] = entry
+        self._entries.move_to_end(movie_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, movie_ids, count=True):
+        """{movie_id: (url, status)} for the fresh entries among `movie_ids` (one query for LRU misses).
+
+        With `count=False` the lookups are left out of the hit/miss stats.
+        """
+        now = time.time()
+        found, lookup = {}, []
+        with self._lock:
+            for movie_id in dict.fromkeys(movie_ids):
+                entry = self._entries.get(movie_id)
+                if entry is not None and self._fresh(entry, now):
+                    self._entries.move_to_end(movie_id)
+                    self.memory_hits += count
+                    found[movie_id] = entry[:2]
+                else:
+                    lookup.append(movie_id)
+        if not lookup:
+            return found
+
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT movie_id, url, status, fetched_at FROM posters WHERE movie_id IN ({})".format(
+                ",".join("?" * len(lookup))), lookup).fetchall()
+        conn.close()
+
+        with self._lock:
+            for movie_id, url, status, fetched_at in rows:
+                if self._fresh((url, status, fetched_at), now):
+                    self._remember(movie_id, (url, status, fetched_at))
+                    self.db_hits += count
+                    found[movie_id] = (url, status)
+            if count:
+                self.misses += sum(1 for movie_id in lookup if movie_id not in found)
+        return found
+
+    def put(self, movie_id, url, status):
+        fetched_at = time.time()
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO posters (movie_id, url, fetched_at, status) VALUES (?, ?, ?, ?)",
+                     (movie_id, url, fetched_at, status))
+        conn.commit()
+        conn.close()
+        with self._lock:
+            self._remember(movie_id, (url, status, fetched_at))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "memory_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+                "ttl_seconds": dict(self.ttls),
+            }
+
+
+class PosterResolver:
+    """Poster URLs from the cache, fetching misses with `fetch(movie_id) -> (url, status)`.
+
+    Misses are fetched on a shared pool of `max_workers` threads, so a page of
+    recommendations waits for about one TMDB round-trip rather than one per
+    movie. Background prefetches run on their own `prefetch_workers` threads,
+    so they never queue ahead of a waiting request; an id is queued at most
+    once, and at most `max_pending` are queued at a time.
+    """
+
+    def __init__(self, cache, fetch, max_workers=8, prefetch_workers=2, max_pending=1000):
+        self.cache = cache
+        self.fetch = fetch
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poster")
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="poster-prefetch")
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+    def _fetch_and_store(self, movie_id):
+        url, status = self.fetch(movie_id)
+        if status != UNAVAILABLE:
+            self.cache.put(movie_id, url, status)
+        return url, status
+
+    def resolve_many(self, movie_ids):
+        """{movie_id: display URL} for every id in `movie_ids`"""
+        results = self.cache.get_many(movie_ids)
+        misses = [movie_id for movie_id in dict.fromkeys(movie_ids) if movie_id not in results]
+        if len(misses) == 1:
+            results[misses[0]] = self._fetch_and_store(misses[0])
+        elif misses:
+            for movie_id, result in zip(misses, self._pool.map(self._fetch_and_store, misses)):
+                results[movie_id] = result
+        return {movie_id: display_url(*result) for movie_id, result in results.items()}
+
+    def cached(self, movie_ids):
+        """{movie_id: display URL} for the ids already in the cache; never calls TMDB"""
+        return {movie_id: display_url(*result) for movie_id, result in self.cache.get_many(movie_ids).items()}
+
+    def prefetch(self, movie_ids):
+        """Fetch and cache `movie_ids` in the background without waiting (ids already queued are skipped)"""
+        with self._pending_lock:
+            queued = [movie_id for movie_id in dict.fromkeys(movie_ids) if movie_id not in self._pending]
+            queued = queued[:max(0, self.max_pending - len(self._pending))]
+            self._pending.update(queued)
+        for movie_id in queued:
+            self._prefetch_pool.submit(self._prefetch_one, movie_id)
+
+    def _prefetch_one(self, movie_id):
+        try:
+            # A request may have fetched it while this one was queued
+            if not self.cache.get_many([movie_id], count=False):
+                self._fetch_and_store(movie_id)
+        finally:
+            with self._pending_lock:
+                self._pending.discard(movie_id)
+
+    def stats(self):
+        with self._pending_lock:
+            return {"prefetch_pending": len(self._pending), "max_pending": self.max_pending}
+
+
+class PosterWarmer:
+    """Background thread that fetches uncached posters before anyone asks for them.
+
+    Each pass walks `catalog_order()` (movie_ids, most popular first), after
+    the first `popular_head` of them putting the movies recommended most
+    often in this process, and fetches every poster that is not cached. It
+    makes one call at a time, at most `rate` per second, so it holds at most
+    one of the TMDB client's connection slots. After a full pass it sleeps
+    `idle_seconds` and starts over to refresh expired entries.
+
+    With `lock_path`, only the process holding an exclusive lock on that file
+    warms (several workers share one cache); the others stand by and retry
+    the lock every `idle_seconds`, taking over if the warming process exits.
+    """
+
+    chunk_size = 100
+
+    def __init__(self, cache, fetch, catalog_order, rate=2.0, popular_head=50, idle_seconds=600,
+                 lock_path=None):
+        self.cache = cache
+        self.fetch = fetch
+        self.catalog_order = catalog_order
+        self.rate = rate
+        self.popular_head = popular_head
+        self.idle_seconds = idle_seconds
+        self.lock_path = lock_path
+        self.state = "stopped"
+        self.passes = 0
+        self.position = 0
+        self.total = 0
+        self.already_cached = 0
+        self.fetched = Counter()
+        self.last_pass_finished_at = None
+        self._recommended = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._lock_file = None
+
+    def record(self, movie_ids):
+        """Count movies that were just recommended, so they are warmed early"""
+        with self._lock:
+            self._recommended.update(movie_ids)
+
+    def order(self):
+        """Movie ids to warm: popular head, then most recommended, then the rest of the catalog"""
+        popular = list(self.catalog_order())
+        with self._lock:
+            recommended = [movie_id for movie_id, _ in self._recommended.most_common()]
+        return list(dict.fromkeys(popular[:self.popular_head] + recommended + popular))
+
+    def start(self):
+        if self._thread is not None or self.rate <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="poster-warmer", daemon=True)
+        self._thread.start()
+
+    def _holds_lock(self):
+        """Whether this process may warm; takes the lock file on first success"""
+        if self.lock_path is None or fcntl is None or self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held (and kept open) for the life of the process
+        self._lock_file = lock_file
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self._holds_lock():
+                    self.warm_once()
+                else:
+                    self.state = "standby"
+            except Exception as e:
+                print(f"⚠️ Poster warmer pass failed: {e}")
+                self.state = "failed"
+            time.sleep(self.idle_seconds)
+
+    def warm_once(self):
+        """One pass over the catalog, fetching uncached posters at the rate limit"""
+        self.state = "warming"
+        order = self.order()
+        self.total, self.position = len(order), 0
+        interval = 1.0 / self.rate
+        for start in range(0, len(order), self.chunk_size):
+            chunk = order[start:start + self.chunk_size]
+            cached = self.cache.get_many(chunk, count=False)
+            self.already_cached += len(cached)
+            for movie_id in chunk:
+                if movie_id in cached:
+                    continue
+                started = time.monotonic()
+                url, status = self.fetch(movie_id)
+                if status != UNAVAILABLE:
+                    self.cache.put(movie_id, url, status)
+                self.fetched[status] += 1
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+            self.position = start + len(chunk)
+        self.passes += 1
+        self.last_pass_finished_at = time.time()
+        self.state = "idle"
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "rate_per_second": self.rate,
+            "passes": self.passes,
+            "position": self.position,
+            "total": self.total,
+            "already_cached": self.already_cached,
+            "fetched": dict(self.fetched),
+            "last_pass_finished_at": self.last_pass_finished_at,
+        }
@@ -0,0 +1,133 @@
+"""Per-user taste profiles built from liked movies, cached in memory"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from recommender import EmbeddingModel, top_k
+
+# Neighbors of each liked movie that feed a sparse (non-embedding) profile
+PROFILE_NEIGHBORS = 100
+
+
+class UserProfile:
+    """Aggregate of a user's liked movies under one similarity model.
+
+    Embedding models keep the sum of the liked embeddings (scored as one
+    query vector); other models keep the summed neighbor scores of the liked
+    movies as sparse (candidates, scores) arrays. Either way a new like is
+    folded in without revisiting the user's history. `add` and `recommend`
+    may run on different threads: the profile is updated under its own lock,
+    and `recommend` reads one consistent copy of it.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.liked_rows = set()
+        self.vector = np.zeros(model.dim, dtype=np.float32) if isinstance(model, EmbeddingModel) else None
+        self.candidates = np.empty(0, dtype=np.intp)
+        self.scores = np.empty(0, dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def add(self, rows):
+        """Fold newly liked catalog rows into the profile"""
+        with self._lock:
+            rows = [int(row) for row in rows if int(row) not in self.liked_rows]
+            if not rows:
+                return
+
+            if self.vector is not None:
+                self.vector = self.vector + self.model.vectors(rows).sum(axis=0)
+            else:
+                lists = [self.model.neighbors(row, PROFILE_NEIGHBORS) for row in rows]
+                indices = np.concatenate([self.candidates] + [indices for indices, _ in lists])
+                scores = np.concatenate([self.scores] + [scores for _, scores in lists])
+                candidates, inverse = np.unique(indices, return_inverse=True)
+                self.candidates, self.scores = candidates, np.bincount(
+                    inverse, weights=scores, minlength=candidates.shape[0]).astype(np.float32)
+            self.liked_rows.update(rows)
+
+    def recommend(self, k, limit=None):
+        """Top-k (indices, scores) for the user, leaving out movies they already liked"""
+        with self._lock:
+            liked = np.fromiter(self.liked_rows, dtype=np.intp, count=len(self.liked_rows))
+            vector, candidates, scores = self.vector, self.candidates, self.scores
+        if not len(liked):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        if vector is not None:
+            return self.model.search(vector, k, limit=limit, exclude=liked)
+
+        keep = ~np.isin(candidates, liked)
+        if limit is not None:
+            keep &= candidates < limit
+        candidates, scores = candidates[keep], scores[keep]
+        order = top_k(scores, k)
+        return candidates[order], scores[order]
+
+
+class ProfileCache:
+    """Thread-safe LRU cache of user profiles.
+
+    Profiles built for a different model object are treated as missing, so
+    swapping the model rebuilds them on next use. The cache lock only guards
+    the dict: profiles are built and updated outside it. Likes recorded while
+    a profile is being built are kept and folded in once the build finishes,
+    so a like committed after `load_liked_rows` read the database is not lost.
+    """
+
+    def __init__(self, max_users=10000):
+        self.max_users = max_users
+        self._profiles = OrderedDict()
+        # user_id -> [(model, rows liked since the build started)] for profiles being built
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id, model, load_liked_rows):
+        """Cached profile for `user_id`, built from `load_liked_rows()` on a miss"""
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None and profile.model is model:
+                self._profiles.move_to_end(user_id)
+                return profile
+            build = (model, [])
+            self._building.setdefault(user_id, []).append(build)
+
+        profile = UserProfile(model)
+        try:
+            profile.add(load_liked_rows())
+        except Exception:
+            with self._lock:
+                self._end_build(user_id, build)
+            raise
+
+        with self._lock:
+            self._end_build(user_id, build)
+            self._profiles[user_id] = profile
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_users:
+                self._profiles.popitem(last=False)
+
+        # From here on `record_like` finds the cached profile itself
+        profile.add(build[1])
+        return profile
+
+    def _end_build(self, user_id, build):
+        """Stop collecting likes for `build`; caller holds the lock"""
+        builds = [other for other in self._building[user_id] if other is not build]
+        if builds:
+            self._building[user_id] = builds
+        else:
+            del self._building[user_id]
+
+    def record_like(self, user_id, row, model):
+        """Update a cached profile (or one being built) after the user likes a movie"""
+        with self._lock:
+            for build_model, rows in self._building.get(user_id, ()):
+                if build_model is model:
+                    rows.append(row)
+            profile = self._profiles.get(user_id)
+            if profile is None or profile.model is not model:
+                return
+        profile.add([row])
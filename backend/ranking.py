@@ -0,0 +1,118 @@
+"""Hybrid ranking of recommendation candidates.
+
+Candidates come from a similarity model; each one is then scored as a
+weighted sum of per-candidate signal arrays:
+
+    content     similarity to the seed movie from the candidate model
+    rating      catalog rating / 10
+    popularity  log(1 + likes), scaled so the most liked movie scores 1
+    cf          item-item collaborative filtering score with the seed movie
+
+Every signal is computed with array operations over the whole candidate set.
+An optional maximal-marginal-relevance pass then trades relevance for
+diversity among the top candidates.
+"""
+
+import os
+
+import numpy as np
+
+from recommender import top_k
+
+SIGNALS = ("content", "rating", "popularity", "cf")
+DEFAULT_WEIGHTS = {"content": 1.0, "rating": 0.0, "popularity": 0.0, "cf": 0.0}
+
+# Candidates generated per requested result when any non-content weight is set
+CANDIDATE_FACTOR = 10
+MIN_CANDIDATES = 100
+
+
+def parse_weights(text, base=None):
+    """Weights from a "signal:weight,..." string, on top of `base`.
+
+    Raises ValueError for an unknown signal or a non-numeric weight.
+    """
+    weights = dict(DEFAULT_WEIGHTS if base is None else base)
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition(":")
+        name = name.strip()
+        if name not in SIGNALS:
+            raise ValueError(f"Unknown ranking signal '{name}', expected one of {list(SIGNALS)}")
+        weights[name] = float(value)
+    return weights
+
+
+def deployment_weights():
+    """Default weights for this deployment, from the RANKING_WEIGHTS environment variable"""
+    return parse_weights(os.environ.get("RANKING_WEIGHTS", ""))
+
+
+def is_hybrid(weights):
+    """Whether `weights` use anything besides the candidate model's similarity"""
+    return any(weights[name] for name in SIGNALS if name != "content")
+
+
+def scores_at(indices, scores, candidates):
+    """Score of each candidate in an (indices, scores) list, 0 where it is absent"""
+    indices = np.asarray(indices, dtype=np.intp)
+    result = np.zeros(len(candidates), dtype=np.float32)
+    if not indices.shape[0]:
+        return result
+    order = np.argsort(indices, kind="stable")
+    sorted_indices = indices[order]
+    positions = np.minimum(np.searchsorted(sorted_indices, candidates), sorted_indices.shape[0] - 1)
+    found = sorted_indices[positions] == candidates
+    result[found] = np.asarray(scores, dtype=np.float32)[order][positions[found]]
+    return result
+
+
+def rating_signal(ratings, candidates):
+    values = np.asarray(ratings, dtype=np.float32)[candidates] / 10.0
+    return np.nan_to_num(values, nan=0.0)
+
+
+def popularity_signal(popularity, candidates):
+    """Log-scaled like counts; movies newer than the counts score 0"""
+    popularity = np.asarray(popularity)
+    if not popularity.shape[0]:
+        return np.zeros(len(candidates), dtype=np.float32)
+    counts = np.zeros(len(candidates), dtype=np.float32)
+    known = candidates < popularity.shape[0]
+    counts[known] = popularity[candidates[known]]
+    top = np.log1p(max(float(popularity.max()), 1.0))
+    return (np.log1p(np.maximum(counts, 0)) / top).astype(np.float32)
+
+
+def hybrid_rank(candidates, signals, weights, k, offset=0):
+    """Top-k (candidates, scores) by the weighted sum of the `signals` arrays"""
+    total = np.zeros(len(candidates), dtype=np.float32)
+    for name, values in signals.items():
+        if weights.get(name):
+            total += np.float32(weights[name]) * values
+    order = top_k(total, k, offset=offset)
+    return candidates[order], total[order]
+
+
+def mmr_rerank(candidates, relevance, similarity, k, lam):
+    """Pick k candidates by maximal marginal relevance, best first.
+
+    Each pick maximizes ``lam * relevance - (1 - lam) * max similarity to the
+    picks so far``; `similarity` is the candidates' pairwise similarity
+    matrix. The running max is updated with one vector operation per pick,
+    so selecting k of m candidates costs O(k * m).
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    k = min(k, len(candidates))
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    picks = np.empty(k, dtype=np.intp)
+    for step in range(k):
+        scores = lam * relevance - (1.0 - lam) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        picks[step] = pick
+        available[pick] = False
+        np.maximum(redundancy, similarity[pick], out=redundancy)
+    return candidates[picks], relevance[picks]
@@ -0,0 +1,822 @@
+"""Recommendation scoring helpers used by the backend"""
+
+import copy
+import pickle
+
+import numpy as np
+import scipy.sparse as sp
+
+from ann import IVFIndex
+
+
+def top_k(scores, k, offset=0, exclude=None, allowed=None):
+    """Return indices of the k highest scores (after skipping `offset`), best first.
+
+    Only the top `offset + k` entries are selected with a partial sort, so the
+    cost is O(N) for the selection plus O(k log k) for ordering the winners.
+    Indices listed in `exclude`, and those where the boolean mask `allowed` is
+    False, are masked out instead of relying on their rank.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    n = scores.shape[0]
+
+    valid = None
+    if allowed is not None:
+        valid = allowed_rows(allowed, np.arange(n))
+    if exclude is not None and len(exclude):
+        exclude = np.asarray(exclude, dtype=np.intp)
+        if valid is None:
+            valid = np.ones(n, dtype=bool)
+        valid[exclude[exclude < n]] = False
+
+    if valid is not None:
+        scores = np.where(valid, scores, -np.inf)
+        n_valid = int(valid.sum())
+    else:
+        n_valid = n
+
+    end = min(offset + k, n_valid)
+    if k <= 0 or end <= offset:
+        return np.empty(0, dtype=np.intp)
+
+    if end < n:
+        candidates = np.argpartition(-scores, end - 1)[:end]
+    else:
+        candidates = np.arange(n)
+
+    # Stable sort keeps equal scores in catalog order
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order][offset:end]
+
+
+def allowed_rows(allowed, indices):
+    """`allowed[indices]`, treating rows past the end of the mask as not allowed"""
+    indices = np.asarray(indices, dtype=np.intp)
+    in_range = indices < allowed.shape[0]
+    result = np.zeros(indices.shape[0], dtype=bool)
+    result[in_range] = allowed[indices[in_range]]
+    return result
+
+
+QUANTIZE_MODES = ("float16", "int8")
+
+
+def quantize_int8(values, scale):
+    """Quantize `values` to int8 given the per-row `scale` (broadcast by the caller)"""
+    safe_scale = np.where(scale > 0, scale, 1.0)
+    return np.clip(np.rint(values / safe_scale), -127, 127).astype(np.int8)
+
+
+def row_scales(values, axis=1):
+    """Per-row int8 scale: the largest absolute value maps to 127"""
+    return (np.abs(values).max(axis=axis) / 127.0).astype(np.float32)
+
+
+def top_k_rows(block, k, self_columns=None):
+    """Top-k (indices, scores) of every row of a dense block of similarity rows.
+
+    `self_columns[i]` is the column of row i's own movie, which is masked so a
+    movie is never its own neighbor. `block` is modified in place.
+    """
+    if self_columns is not None:
+        rows = np.arange(block.shape[0])
+        self_columns = np.asarray(self_columns)
+        in_range = self_columns < block.shape[1]
+        block[rows[in_range], self_columns[in_range]] = -np.inf
+
+    k = max(0, min(k, block.shape[1] - 1))
+    if k:
+        part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    else:
+        part = np.empty((block.shape[0], 0), dtype=np.intp)
+    part_scores = np.take_along_axis(block, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+def batch_rows(n_items, budget_bytes=64 * 1024 * 1024):
+    """How many full float32 score rows fit in `budget_bytes`"""
+    return max(1, budget_bytes // (4 * max(n_items, 1)))
+
+
+class DenseSimilarity:
+    """Full N x N similarity matrix (the legacy similarity.pkl format)"""
+
+    kind = "dense"
+
+    def __init__(self, matrix, scale=None):
+        self.matrix = matrix
+        # Per-row scale for int8 matrices, None for float storage
+        self.scale = scale
+
+    @property
+    def n_items(self):
+        return self.matrix.shape[0]
+
+    @property
+    def shape(self):
+        return tuple(self.matrix.shape)
+
+    @property
+    def dtype(self):
+        return self.matrix.dtype.name
+
+    @property
+    def nbytes(self):
+        scale_bytes = self.scale.nbytes if self.scale is not None else 0
+        return int(self.matrix.nbytes + scale_bytes)
+
+    def to_arrays(self):
+        arrays = {"matrix": self.matrix}
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, params=None):
+        return cls(arrays["matrix"], arrays.get("scale"))
+
+    def params(self):
+        return {}
+
+    def quantize(self, mode, block_rows=1024):
+        """Copy of this matrix stored as float16, or int8 with a per-row scale"""
+        n = self.matrix.shape[0]
+        if mode == "float16":
+            return DenseSimilarity(np.asarray(self.matrix, dtype=np.float16))
+
+        matrix = np.empty(self.matrix.shape, dtype=np.int8)
+        scale = np.empty(n, dtype=np.float32)
+        for start in range(0, n, block_rows):
+            stop = min(start + block_rows, n)
+            block = np.array(self.matrix[start:stop], dtype=np.float32)
+            scale[start:stop] = row_scales(block)
+            matrix[start:stop] = quantize_int8(block, scale[start:stop, None])
+        return DenseSimilarity(matrix, scale)
+
+    @property
+    def supports_updates(self):
+        return False
+
+    def row(self, idx):
+        """Similarity of movie `idx` to every other movie"""
+        row = np.asarray(self.matrix[idx], dtype=np.float32)
+        if self.scale is not None:
+            row *= self.scale[idx]
+        return row
+
+    def neighbors(self, idx, k, offset=0, limit=None, allowed=None, min_results=None):
+        """Top-k (indices, scores) for movie `idx`, excluding itself.
+
+        `limit` restricts results to the first `limit` rows, for matrices that
+        are larger than the catalog they are served with. `allowed` is an
+        optional boolean mask over catalog rows; other rows are never returned.
+        Every row is scored, so `min_results` (see NeighborIndex) has no effect.
+        """
+        scores = self.row(idx)
+        if limit is not None:
+            scores = scores[:limit]
+        exclude = [idx] if idx < scores.shape[0] else None
+        indices = top_k(scores, k, offset=offset, exclude=exclude, allowed=allowed)
+        return indices, scores[indices]
+
+    def batch_neighbors(self, rows, k, limit=None):
+        """Top-k (indices, scores) for several movies, scored as whole row blocks"""
+        rows = np.asarray(rows, dtype=np.intp)
+        results = []
+        step = batch_rows(self.matrix.shape[1])
+        for start in range(0, rows.shape[0], step):
+            chunk = rows[start:start + step]
+            block = np.array(self.matrix[chunk], dtype=np.float32)
+            if self.scale is not None:
+                block *= self.scale[chunk, None]
+            if limit is not None:
+                block = block[:, :limit]
+            indices, scores = top_k_rows(block, min(k, block.shape[1] - 1), chunk)
+            results.extend(zip(indices, scores))
+        return results
+
+
+    def blend(self, rows, weights, k, limit=None):
+        """Top-k for a weighted set of seed movies, excluding the seeds"""
+        rows = np.asarray(rows, dtype=np.intp)
+        weights = np.asarray(weights, dtype=np.float32)
+        scores = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        step = batch_rows(self.matrix.shape[1])
+        for start in range(0, rows.shape[0], step):
+            chunk = rows[start:start + step]
+            chunk_weights = weights[start:start + step]
+            if self.scale is not None:
+                chunk_weights = chunk_weights * self.scale[chunk]
+            scores += chunk_weights @ np.asarray(self.matrix[chunk], dtype=np.float32)
+        if limit is not None:
+            scores = scores[:limit]
+        indices = top_k(scores, k, exclude=rows)
+        return indices, scores[indices]
+
+    def pairwise(self, rows):
+        """(len(rows) x len(rows)) similarities between the given movies"""
+        rows = np.asarray(rows, dtype=np.intp)
+        block = np.asarray(self.matrix[rows], dtype=np.float32)[:, rows]
+        if self.scale is not None:
+            block *= self.scale[rows, None]
+        return block
+
+
+class NeighborIndex:
+    """Top-K neighbors per movie stored as CSR-style arrays.
+
+    Row i's neighbors are indices[indptr[i]:indptr[i + 1]], sorted by
+    descending score, with the movie itself left out. Memory is O(N * K)
+    instead of the O(N^2) of a dense matrix.
+
+    When the content `features` the index was built from are kept (a sparse
+    N x n_features matrix), movies can be added or edited with `set_item`.
+    Their lists, and the lists of existing movies they now belong to, are
+    kept as in-memory overrides on top of the stored arrays. `set_item`
+    returns a new index, so an index that requests are reading never changes.
+    """
+
+    kind = "neighbors"
+
+    def __init__(self, indptr, indices, scores, scale=None, features=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        # Per-row scale for int8 scores, None for float storage
+        self.scale = scale
+        self.features = features
+        # row -> (indices, float32 scores) replacing the stored list
+        self.overrides = {}
+        # row -> dense feature vector for movies added or edited since the build
+        self.updated_features = {}
+        self.n_appended = 0
+
+    @classmethod
+    def empty(cls, n_items):
+        """Index where no movie has any neighbors"""
+        return cls(np.zeros(n_items + 1, dtype=np.int64),
+                   np.empty(0, dtype=np.int32),
+                   np.empty(0, dtype=np.float32))
+
+    @classmethod
+    def from_dense(cls, matrix, k, dtype=np.float32, block_rows=1024):
+        """Keep the top-k neighbors of every row of a dense similarity matrix.
+
+        Rows are processed in blocks so only `block_rows` rows are converted
+        to float32 at a time.
+        """
+        n = matrix.shape[0]
+        k = max(0, min(k, n - 1))
+        indices = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=dtype)
+
+        for start in range(0, n, block_rows):
+            stop = min(start + block_rows, n)
+            block = np.array(matrix[start:stop], dtype=np.float32)
+            indices[start:stop], scores[start:stop] = top_k_rows(block, k, np.arange(start, stop))
+
+        indptr = np.arange(n + 1, dtype=np.int64) * k
+        return cls(indptr, indices.ravel(), scores.ravel())
+
+    @property
+    def n_stored(self):
+        return self.indptr.shape[0] - 1
+
+    @property
+    def n_items(self):
+        return self.n_stored + self.n_appended
+
+    @property
+    def shape(self):
+        lengths = np.diff(self.indptr)
+        return (self.n_items, int(lengths.max()) if lengths.size else 0)
+
+    @property
+    def supports_updates(self):
+        return self.features is not None
+
+    @property
+    def dtype(self):
+        return self.scores.dtype.name
+
+    @property
+    def nbytes(self):
+        scale_bytes = self.scale.nbytes if self.scale is not None else 0
+        return int(self.indptr.nbytes + self.indices.nbytes + self.scores.nbytes + scale_bytes)
+
+    def quantize(self, mode):
+        """Copy of this index with float16 scores, or int8 scores with a per-row scale"""
+        if self.overrides:
+            return NeighborIndex.from_arrays(self.to_arrays(), self.params()).quantize(mode)
+        if mode == "float16":
+            return NeighborIndex(self.indptr, self.indices, np.asarray(self.scores, dtype=np.float16),
+                                 features=self.features)
+
+        scores = np.asarray(self.scores, dtype=np.float32)
+        lengths = np.diff(self.indptr)
+        scale = np.zeros(self.n_items, dtype=np.float32)
+        nonempty = lengths > 0
+        if scores.size:
+            row_max = np.maximum.reduceat(np.abs(scores), self.indptr[:-1][nonempty])
+            scale[nonempty] = row_max / 127.0
+        return NeighborIndex(self.indptr, self.indices,
+                             quantize_int8(scores, np.repeat(scale, lengths)), scale, self.features)
+
+    def row_list(self, idx):
+        """Full neighbor list (indices, float32 scores) of movie `idx`"""
+        if idx in self.overrides:
+            return self.overrides[idx]
+        if idx >= self.n_stored:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        start, stop = int(self.indptr[idx]), int(self.indptr[idx + 1])
+        indices = np.asarray(self.indices[start:stop], dtype=np.intp)
+        scores = np.asarray(self.scores[start:stop], dtype=np.float32)
+        if self.scale is not None:
+            scores *= self.scale[idx]
+        return indices, scores
+
+    def neighbors(self, idx, k, offset=0, limit=None, allowed=None, min_results=None):
+        """Top-k (indices, scores) for movie `idx` from its stored neighbor list.
+
+        With an `allowed` mask the stored list is filtered first; if fewer
+        than `min_results` (default `offset + k`) entries survive and the
+        content features are kept, the movie is rescored against the whole
+        catalog instead. Callers that ask for extra candidates to re-rank
+        pass the number of results they actually need.
+        """
+        indices, scores = self.row_list(idx)
+        if limit is not None:
+            keep = indices < limit
+            indices, scores = indices[keep], scores[keep]
+        if allowed is not None:
+            keep = allowed_rows(allowed, indices)
+            indices, scores = indices[keep], scores[keep]
+            if indices.shape[0] < (min_results or offset + k) and self.features is not None:
+                scores = self.similarities(self.feature_vector(idx))
+                if limit is not None:
+                    scores = scores[:limit]
+                indices = top_k(scores, k, offset=offset, exclude=[idx], allowed=allowed)
+                return indices, scores[indices]
+        return indices[offset:offset + k], scores[offset:offset + k]
+
+    def batch_neighbors(self, rows, k, limit=None):
+        """Top-k (indices, scores) for several movies (a slice of each stored list)"""
+        return [self.neighbors(idx, k, limit=limit) for idx in rows]
+
+    def gather(self, rows, weights=None):
+        """Concatenated neighbor (indices, scores) of `rows`, scores scaled by `weights`"""
+        indices, scores, _ = self._gather(rows, weights)
+        return indices, scores
+
+    def _gather(self, rows, weights=None):
+        """`gather` plus, for every entry, the position in `rows` of the list it came from"""
+        rows = np.asarray(rows, dtype=np.intp)
+        weights = np.ones(rows.shape[0], dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+
+        # Rows with in-memory lists are gathered one by one, the rest in one pass
+        patched = rows >= self.n_stored
+        if self.overrides:
+            patched |= np.isin(rows, np.fromiter(self.overrides, dtype=np.intp, count=len(self.overrides)))
+        stored = np.flatnonzero(~patched)
+        indices, scores, lengths = self._gather_stored(rows[stored], weights[stored])
+        owners = np.repeat(stored, lengths)
+        if patched.any():
+            lists = [self.row_list(row) for row in rows[patched]]
+            indices = np.concatenate([indices] + [row_indices for row_indices, _ in lists])
+            scores = np.concatenate([scores] + [row_scores * weight for (_, row_scores), weight
+                                                in zip(lists, weights[patched])])
+            owners = np.concatenate([owners, np.repeat(np.flatnonzero(patched),
+                                                       [len(row_indices) for row_indices, _ in lists])])
+        return indices, scores, owners
+
+    def _gather_stored(self, rows, weights):
+        starts = np.asarray(self.indptr[rows], dtype=np.int64)
+        lengths = np.asarray(self.indptr[rows + 1], dtype=np.int64) - starts
+        # Positions of every stored neighbor of every row, without a Python loop
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        positions = offsets + np.arange(int(lengths.sum()))
+
+        indices = np.asarray(self.indices[positions], dtype=np.intp)
+        scores = np.asarray(self.scores[positions], dtype=np.float32)
+        row_factor = weights
+        if self.scale is not None:
+            row_factor = row_factor * self.scale[rows]
+        return indices, scores * np.repeat(row_factor, lengths), lengths
+
+    def blend(self, rows, weights, k, limit=None):
+        """Top-k for a weighted set of seed movies, excluding the seeds.
+
+        Scores are summed over the seeds' stored neighbor lists, so a movie
+        outside every list scores zero and is never returned.
+        """
+        indices, scores = self.gather(rows, weights)
+        candidates, inverse = np.unique(indices, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores, minlength=candidates.shape[0]).astype(np.float32)
+
+        keep = ~np.isin(candidates, rows)
+        if limit is not None:
+            keep &= candidates < limit
+        candidates, totals = candidates[keep], totals[keep]
+        order = top_k(totals, k)
+        return candidates[order], totals[order]
+
+    def pairwise(self, rows):
+        """(len(rows) x len(rows)) similarities between the given movies.
+
+        Read from the stored lists: a pair scores the larger of its two list
+        entries, or 0 when neither movie lists the other.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        block = np.zeros((rows.shape[0], rows.shape[0]), dtype=np.float32)
+        if not rows.shape[0]:
+            return block
+
+        # All lists at once: keep the entries that are among `rows`, locate them in
+        # the sorted rows, and scatter each pair in both directions keeping the larger score
+        indices, scores, owners = self._gather(rows)
+        found = np.isin(indices, rows)
+        order = np.argsort(rows, kind="stable")
+        columns = order[np.searchsorted(rows[order], indices[found])]
+        owners, scores = owners[found], scores[found]
+        np.maximum.at(block, (np.concatenate([owners, columns]), np.concatenate([columns, owners])),
+                      np.concatenate([scores, scores]))
+        return block
+
+    def feature_vector(self, idx):
+        """Dense content feature vector of movie `idx`"""
+        if idx in self.updated_features:
+            return self.updated_features[idx]
+        return np.asarray(self.features[idx].toarray(), dtype=np.float32).ravel()
+
+    def similarities(self, vector):
+        """Cosine similarity of a unit-length feature vector to every movie"""
+        scores = np.zeros(self.n_items, dtype=np.float32)
+        scores[:self.n_stored] = self.features @ vector
+        for row, row_vector in self.updated_features.items():
+            scores[row] = row_vector @ vector
+        return scores
+
+    def _copy(self):
+        """Copy sharing the stored arrays, with its own in-memory overrides"""
+        model = copy.copy(self)
+        model.overrides = dict(self.overrides)
+        model.updated_features = dict(self.updated_features)
+        return model
+
+    def set_item(self, row, vector):
+        """Copy of the index with a movie added (row == n_items) or re-featurized.
+
+        The movie gets a fresh top-K list, every movie whose list it now makes
+        is patched, and lists that already hold it get its new score. Such a
+        list keeps the movie even if it fell below a movie outside the list
+        until the next offline build. This index is left unchanged.
+        """
+        model = self._copy()
+        model._patch(row, vector)
+        return model
+
+    def _patch(self, row, vector):
+        if row == self.n_items:
+            self.n_appended += 1
+        vector = np.asarray(vector, dtype=np.float32)
+        self.updated_features[row] = vector
+
+        list_size = max(self.shape[1], 1)
+        scores = self.similarities(vector)
+        top = top_k(scores, list_size, exclude=[row])
+        self.overrides[row] = (top, scores[top])
+
+        # Patch every list whose weakest entry the new movie beats
+        weakest = np.full(self.n_items, -np.inf, dtype=np.float32)
+        lengths = np.diff(np.asarray(self.indptr))
+        full = np.flatnonzero(lengths >= list_size)
+        weakest[full] = np.asarray(self.scores[np.asarray(self.indptr[full + 1]) - 1], dtype=np.float32)
+        if self.scale is not None:
+            weakest[full] *= self.scale[full]
+        for other, (indices, other_scores) in self.overrides.items():
+            weakest[other] = other_scores[-1] if len(indices) >= list_size else -np.inf
+
+        # Lists that already hold the movie (stored lists unless overridden, then the overrides) are rescored
+        positions = np.flatnonzero(np.asarray(self.indices) == row)
+        holders = np.searchsorted(np.asarray(self.indptr), positions, side="right") - 1
+        holders = holders[~np.isin(holders, list(self.overrides))]
+        holders = np.concatenate([holders, [other for other, (indices, _) in self.overrides.items()
+                                            if other != row and (indices == row).any()]]).astype(np.intp)
+
+        for other in np.union1d(np.flatnonzero(scores > weakest), holders):
+            if other == row:
+                continue
+            indices, other_scores = self.row_list(other)
+            keep = indices != row
+            indices, other_scores = indices[keep], other_scores[keep]
+            if len(indices) >= list_size and scores[other] <= other_scores[-1]:
+                continue
+            position = np.searchsorted(-other_scores, -scores[other])
+            indices = np.insert(indices, position, row)[:list_size]
+            other_scores = np.insert(other_scores, position, scores[other])[:list_size]
+            self.overrides[int(other)] = (indices, other_scores)
+
+    def to_arrays(self):
+        indptr, indices, scores, scale = self.indptr, self.indices, self.scores, self.scale
+        if self.overrides:
+            # Materialize the in-memory lists as plain float32 CSR arrays
+            lists = [self.row_list(row) for row in range(self.n_items)]
+            indptr = np.zeros(self.n_items + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(row_indices) for row_indices, _ in lists])
+            indices = np.concatenate([row_indices for row_indices, _ in lists]).astype(np.int32)
+            scores = np.concatenate([row_scores for _, row_scores in lists]).astype(np.float32)
+            scale = None
+
+        arrays = {"indptr": indptr, "indices": indices, "scores": scores}
+        if scale is not None:
+            arrays["scale"] = scale
+        if self.features is not None:
+            features = self.features
+            if self.updated_features:
+                features = sp.lil_matrix(sp.vstack([features, sp.csr_matrix((self.n_appended, features.shape[1]))]))
+                for row, vector in self.updated_features.items():
+                    features[row] = vector
+                features = sp.csr_matrix(features, dtype=np.float32)
+            arrays["features_indptr"] = features.indptr.astype(np.int64)
+            arrays["features_indices"] = features.indices.astype(np.int32)
+            arrays["features_data"] = features.data.astype(np.float32)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, params=None):
+        features = None
+        if "features_indptr" in arrays:
+            n = arrays["features_indptr"].shape[0] - 1
+            features = sp.csr_matrix((arrays["features_data"], arrays["features_indices"], arrays["features_indptr"]),
+                                     shape=(n, (params or {})["n_features"]), copy=False)
+        return cls(arrays["indptr"], arrays["indices"], arrays["scores"], arrays.get("scale"), features)
+
+    def params(self):
+        return {"n_features": self.features.shape[1]} if self.features is not None else {}
+
+
+class EmbeddingModel:
+    """Unit-length N x d movie embeddings scored with a dot product per request.
+
+    Storage is O(N * d) instead of O(N^2). `components` (d x n_features), when
+    present, projects a featurized movie into the embedding space so movies
+    can be added or edited with `set_item` without rebuilding the model.
+
+    With an `ann` index, catalogs of at least `exact_below` movies are searched
+    approximately by probing `n_probe` inverted lists; smaller catalogs (or
+    models without an index) use exact search.
+    """
+
+    kind = "embeddings"
+
+    # Rows scored per chunk when embeddings are not stored as float32
+    score_chunk_rows = 65536
+
+    def __init__(self, embeddings, components=None, scale=None, ann=None, n_probe=8, exact_below=10000):
+        self.embeddings = embeddings
+        self.components = components
+        # Per-row scale for int8 embeddings, None for float storage
+        self.scale = scale
+        self.ann = ann
+        self.n_probe = n_probe
+        self.exact_below = exact_below
+        # Rows appended after the model was built (kept in memory as float32)
+        self.extra = np.empty((0, embeddings.shape[1]), dtype=np.float32)
+        # Stored rows re-embedded after the build: row -> float32 vector
+        self.updated = {}
+
+    @property
+    def n_items(self):
+        return self.embeddings.shape[0] + self.extra.shape[0]
+
+    @property
+    def supports_updates(self):
+        return self.components is not None
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1]
+
+    @property
+    def shape(self):
+        return (self.n_items, self.dim)
+
+    @property
+    def dtype(self):
+        return self.embeddings.dtype.name
+
+    @property
+    def nbytes(self):
+        scale_bytes = self.scale.nbytes if self.scale is not None else 0
+        ann_bytes = self.ann.nbytes if self.ann is not None else 0
+        return int(self.embeddings.nbytes + self.extra.nbytes + scale_bytes + ann_bytes)
+
+    def to_arrays(self):
+        embeddings, scale, ann = self.embeddings, self.scale, self.ann
+        if self.extra.shape[0] or self.updated:
+            embeddings = np.vstack([self.vectors(np.arange(self.embeddings.shape[0])), self.extra])
+            scale = None
+            if ann is not None and self.extra.shape[0]:
+                ann = ann.extended(self.extra)
+        arrays = {"embeddings": embeddings}
+        if scale is not None:
+            arrays["scale"] = scale
+        if self.components is not None:
+            arrays["components"] = self.components
+        if ann is not None:
+            arrays.update(ann.to_arrays())
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, params=None):
+        return cls(arrays["embeddings"], arrays.get("components"), arrays.get("scale"),
+                   IVFIndex.from_arrays(arrays), **(params or {}))
+
+    def params(self):
+        return {"n_probe": self.n_probe, "exact_below": self.exact_below}
+
+    def quantize(self, mode):
+        """Copy with float16 embeddings, or int8 embeddings with a per-row scale"""
+        embeddings = np.asarray(self.to_arrays()["embeddings"], dtype=np.float32)
+        ann = self.ann.extended(self.extra) if self.ann is not None and self.extra.shape[0] else self.ann
+        if mode == "float16":
+            return EmbeddingModel(embeddings.astype(np.float16), self.components, None, ann, **self.params())
+        scale = row_scales(embeddings)
+        return EmbeddingModel(quantize_int8(embeddings, scale[:, None]), self.components, scale, ann,
+                              **self.params())
+
+    def vectors(self, rows):
+        """Float32 embeddings of the given movie rows"""
+        rows = np.asarray(rows, dtype=np.intp)
+        base = self.embeddings.shape[0]
+        out = np.empty((rows.shape[0], self.dim), dtype=np.float32)
+        stored = rows < base
+        out[stored] = self.embeddings[rows[stored]]
+        if self.scale is not None:
+            out[stored] *= self.scale[rows[stored], None]
+        out[~stored] = self.extra[rows[~stored] - base]
+        if self.updated:
+            for position in np.flatnonzero(np.isin(rows, list(self.updated))):
+                out[position] = self.updated[int(rows[position])]
+        return out
+
+    def score(self, vector):
+        """Dot product of `vector` with every movie embedding"""
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.embeddings.dtype == np.float32:
+            scores = np.asarray(self.embeddings @ vector)
+        else:
+            base = self.embeddings.shape[0]
+            scores = np.empty(base, dtype=np.float32)
+            for start in range(0, base, self.score_chunk_rows):
+                stop = min(start + self.score_chunk_rows, base)
+                scores[start:stop] = np.asarray(self.embeddings[start:stop], dtype=np.float32) @ vector
+            if self.scale is not None:
+                scores *= self.scale
+        if self.extra.shape[0]:
+            scores = np.concatenate([scores, self.extra @ vector])
+        for row, row_vector in self.updated.items():
+            scores[row] = row_vector @ vector
+        return scores
+
+    def score_many(self, vectors):
+        """Dot products of each of `vectors` (B x d) with every movie: B x N"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        base = self.embeddings.shape[0]
+        scores = np.empty((vectors.shape[0], self.n_items), dtype=np.float32)
+        for start in range(0, base, self.score_chunk_rows):
+            stop = min(start + self.score_chunk_rows, base)
+            chunk = np.asarray(self.embeddings[start:stop], dtype=np.float32)
+            if self.scale is not None:
+                chunk = chunk * self.scale[start:stop, None]
+            scores[:, start:stop] = vectors @ chunk.T
+        if self.extra.shape[0]:
+            scores[:, base:] = vectors @ self.extra.T
+        for row, row_vector in self.updated.items():
+            scores[:, row] = vectors @ row_vector
+        return scores
+
+    def row(self, idx):
+        """Similarity of movie `idx` to every other movie"""
+        return self.score(self.vectors([idx])[0])
+
+    def batch_neighbors(self, rows, k, limit=None):
+        """Top-k (indices, scores) for several movies with one matrix product per block"""
+        rows = np.asarray(rows, dtype=np.intp)
+        if self.ann is not None and self.n_items >= self.exact_below:
+            return [self.ann_neighbors(idx, k, limit=limit) for idx in rows]
+
+        results = []
+        step = batch_rows(self.n_items)
+        for start in range(0, rows.shape[0], step):
+            chunk = rows[start:start + step]
+            block = self.score_many(self.vectors(chunk))
+            if limit is not None:
+                block = block[:, :limit]
+            indices, scores = top_k_rows(block, min(k, block.shape[1] - 1), chunk)
+            results.extend(zip(indices, scores))
+        return results
+
+    def search(self, vector, k, offset=0, limit=None, exclude=None, n_probe=None, exact=None, allowed=None,
+               min_results=None):
+        """Top-k (indices, scores) of movies by dot product with `vector`.
+
+        Uses the ANN index for large catalogs unless `exact` is set; rows in
+        `exclude`, or outside the boolean mask `allowed`, are never returned.
+        When a mask leaves fewer than `min_results` (default `offset + k`) ANN
+        candidates, the number of probed lists is doubled until enough
+        survive, ending with an exact scan of the whole catalog.
+        """
+        if exact is None:
+            exact = self.ann is None or self.n_items < self.exact_below
+        if exact:
+            scores = self.score(vector)
+            if limit is not None:
+                scores = scores[:limit]
+            indices = top_k(scores, k, offset=offset, exclude=exclude, allowed=allowed)
+            return indices, scores[indices]
+
+        n_probe = n_probe or self.n_probe
+        while True:
+            candidates = self.ann.candidates(vector, n_probe)
+            if self.extra.shape[0]:
+                candidates = np.concatenate([candidates, np.arange(self.embeddings.shape[0], self.n_items)])
+            keep = np.ones(candidates.shape[0], dtype=bool)
+            if exclude is not None and len(exclude):
+                keep &= ~np.isin(candidates, exclude)
+            if limit is not None:
+                keep &= candidates < limit
+            if allowed is not None:
+                keep &= allowed_rows(allowed, candidates)
+            candidates = candidates[keep]
+            if allowed is None or candidates.shape[0] >= (min_results or offset + k):
+                break
+            if n_probe >= self.ann.n_lists:
+                return self.search(vector, k, offset=offset, limit=limit, exclude=exclude,
+                                   exact=True, allowed=allowed)
+            n_probe *= 2
+
+        scores = self.vectors(candidates) @ vector
+        order = top_k(scores, k, offset=offset)
+        return candidates[order], scores[order]
+
+    def neighbors(self, idx, k, offset=0, limit=None, allowed=None, min_results=None):
+        """Top-k (indices, scores) for movie `idx`, excluding itself"""
+        return self.search(self.vectors([idx])[0], k, offset=offset, limit=limit, exclude=[idx],
+                           allowed=allowed, min_results=min_results)
+
+    def exact_neighbors(self, idx, k, offset=0, limit=None):
+        """Top-k by scoring every movie"""
+        return self.search(self.vectors([idx])[0], k, offset=offset, limit=limit, exclude=[idx], exact=True)
+
+    def ann_neighbors(self, idx, k, offset=0, limit=None, n_probe=None):
+        """Top-k among the movies in the closest inverted lists (plus appended rows)"""
+        return self.search(self.vectors([idx])[0], k, offset=offset, limit=limit, exclude=[idx],
+                           n_probe=n_probe, exact=False)
+
+    def blend(self, rows, weights, k, limit=None):
+        """Top-k for a weighted set of seed movies, excluding the seeds.
+
+        Dot products are linear, so blending the seeds' score rows equals
+        scoring one weighted query vector.
+        """
+        query = np.asarray(weights, dtype=np.float32) @ self.vectors(rows)
+        return self.search(query, k, limit=limit, exclude=rows)
+
+    def pairwise(self, rows):
+        """(len(rows) x len(rows)) dot products between the given movies"""
+        vectors = self.vectors(np.asarray(rows, dtype=np.intp))
+        return vectors @ vectors.T
+
+    def project(self, features):
+        """Unit-length embedding for a featurized movie (requires `components`)"""
+        if self.components is None:
+            raise ValueError("Model has no projection components")
+        vector = np.asarray(self.components, dtype=np.float32) @ np.asarray(features, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def set_item(self, row, features):
+        """Copy of the model with a movie added (row == n_items) or re-embedded from its content features.
+
+        The copy shares the stored embeddings; this model is left unchanged.
+        """
+        vector = self.project(features)
+        base = self.embeddings.shape[0]
+        model = copy.copy(self)
+        model.updated = dict(self.updated)
+        if row == self.n_items:
+            model.extra = np.vstack([self.extra, vector[None, :].astype(np.float32)])
+        elif row >= base:
+            model.extra = self.extra.copy()
+            model.extra[row - base] = vector
+        else:
+            model.updated[row] = vector
+        return model
+
+
+def load_legacy_similarity(path):
+    """Load a pickled dense similarity matrix (the legacy similarity.pkl format)"""
+    with open(path, "rb") as f:
+        return DenseSimilarity(np.asarray(pickle.load(f)))
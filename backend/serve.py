@@ -0,0 +1,74 @@
+"""Run the backend with several uvicorn worker processes sharing one model.
+
+Run from the backend directory:
+
+    python serve.py --workers 4
+
+Models in the memory-mapped format (see model_store.py) are opened read-only
+with np.memmap, so every worker maps the same page-cache pages and the model
+is held in RAM once however many workers there are. The catalog DataFrame,
+its search index and the result/poster caches are still private to each
+worker. Before starting the workers, the launcher runs the first-run setup
+(so workers never build the model concurrently) and converts a legacy
+similarity.pkl, which each worker would otherwise unpickle into its own
+private copy, into that format. It also splits the TMDB connection budget
+across the workers and lets only one of them warm posters.
+"""
+
+import argparse
+import os
+
+import pandas as pd
+import uvicorn
+
+from bootstrap import LEGACY_SIMILARITY_PATH, MODEL_DIR, create_required_files
+from model_store import catalog_checksum, model_exists, row_hashes, save_model
+from recommender import load_legacy_similarity
+
+CATALOG_PATH = 'data/movies.csv'
+POSTER_WARM_LOCK = 'data/poster_warmer.lock'
+
+
+def share_legacy_model(catalog_path=CATALOG_PATH, model_dir=MODEL_DIR, legacy_path=LEGACY_SIMILARITY_PATH):
+    """Export the pickled dense matrix to `model_dir` when no memory-mapped model exists yet"""
+    if model_exists(model_dir):
+        return False
+    if not (os.path.exists(legacy_path) and os.path.exists(catalog_path)):
+        return False
+    print(f"📦 Exporting {legacy_path} to {model_dir} so workers can share it...")
+    dense = load_legacy_similarity(legacy_path)
+    movies_df = pd.read_csv(catalog_path)
+    save_model(dense, model_dir, catalog_checksum(movies_df), hashes=row_hashes(movies_df))
+    print(f"✅ Wrote {model_dir}: {dense.shape} {dense.dtype} dense matrix ({dense.nbytes / 1e6:.2f} MB)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with shared memory-mapped models")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--watch-interval", type=float, default=5.0,
+                        help="MODEL_WATCH_INTERVAL for the workers unless already set (0 = off)")
+    parser.add_argument("--tmdb-concurrency", type=int,
+                        default=int(os.environ.get("TMDB_MAX_CONCURRENCY", 8)),
+                        help="Concurrent TMDB requests across all workers")
+    args = parser.parse_args()
+
+    create_required_files()
+    share_legacy_model()
+
+    # Each worker holds its own snapshot, so file changes must reach all of them
+    # through the watcher rather than an admin reload served by one worker
+    if args.workers > 1:
+        os.environ.setdefault("MODEL_WATCH_INTERVAL", str(args.watch_interval))
+        os.environ.setdefault("POSTER_WARM_LOCK", POSTER_WARM_LOCK)
+    # Every worker has its own TMDB client, so each gets a share of the total
+    os.environ["TMDB_MAX_CONCURRENCY"] = str(max(1, args.tmdb_concurrency // args.workers))
+
+    print(f"🚀 Starting {args.workers} worker(s) on http://{args.host}:{args.port}")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Serving snapshots: the catalog and models a request reads, swapped as one unit.
+
+A `ServingSnapshot` bundles the catalog DataFrame, its lookup index, the
+content and collaborative filtering models and their side data. Endpoints read
+`SnapshotManager.current` once per request and only use that object, so a
+model deploy never mixes an old catalog with a new model, and in-flight
+requests finish on the snapshot they started with.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from catalog import CatalogIndex
+from collaborative import POPULARITY_FILE
+from features import FEATURIZER_FILE, ContentFeaturizer
+from model_store import HEADER_FILE, catalog_checksum, changed_rows, load_extra, load_model, model_exists, read_header
+from recommender import NeighborIndex, load_legacy_similarity
+
+# Every snapshot gets a unique, increasing version (cache entries are tied to it)
+_versions = itertools.count(1)
+
+# Catalog rows added or edited since the content build that are patched in at load time;
+# beyond this the model has to be rebuilt
+MAX_CATCH_UP_ROWS = 1000
+
+
+class ServingSnapshot:
+    """Immutable bundle of catalog, lookups and models.
+
+    Use `replace` to derive a new snapshot; the original is never modified.
+    Admin movie edits publish a patched copy of the model (`set_item` never
+    changes the model it is called on), so older snapshots keep theirs.
+    """
+
+    def __init__(self, movies_df, similarity_model, cf_model=None, featurizer=None, popularity=None,
+                 source=None, catalog_index=None):
+        self.movies_df = movies_df
+        self.catalog_index = catalog_index if catalog_index is not None else CatalogIndex.from_dataframe(movies_df)
+        self.similarity_model = similarity_model
+        self.cf_model = cf_model
+        self.featurizer = featurizer
+        self.popularity = np.asarray(popularity if popularity is not None else [], dtype=np.int64)
+        self.source = source or {}
+        self.version = next(_versions)
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+
+    def replace(self, **changes):
+        """New snapshot with some components replaced (the catalog index is reused unless the catalog is)"""
+        fields = {
+            "movies_df": self.movies_df,
+            "similarity_model": self.similarity_model,
+            "cf_model": self.cf_model,
+            "featurizer": self.featurizer,
+            "popularity": self.popularity,
+            "source": self.source,
+        }
+        if "movies_df" not in changes:
+            fields["catalog_index"] = self.catalog_index
+        fields.update(changes)
+        return ServingSnapshot(**fields)
+
+    def validate(self):
+        """Raise ValueError if a model has rows past the end of the catalog"""
+        n = len(self.movies_df)
+        # Movies added after a build that cannot be caught up (legacy dense model, CF model)
+        # have no neighbors until the next build
+        if self.similarity_model.n_items > n:
+            raise ValueError(f"Similarity model has {self.similarity_model.n_items} rows, catalog has {n} movies")
+        if self.cf_model is not None and self.cf_model.n_items > n:
+            raise ValueError(f"CF model has {self.cf_model.n_items} rows, catalog has {n} movies")
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "movies": len(self.movies_df),
+            "similarity_model": self.similarity_model.kind,
+            "similarity_shape": self.similarity_model.shape,
+            "cf_model_shape": self.cf_model.shape if self.cf_model is not None else None,
+            "source": self.source,
+        }
+
+
+def load_similarity_model(movies_df, model_dir, legacy_path, featurizer=None):
+    """Load the memory-mapped model, falling back to the legacy pickle.
+
+    Catalog rows added or edited (through the admin endpoints) since the
+    model was built are featurized and patched in, so the model on disk stays
+    usable until the next build_model run folds them in.
+    """
+    if model_exists(model_dir):
+        try:
+            return _load_content_model(movies_df, model_dir, featurizer)
+        except ValueError as e:
+            print(f"⚠️ Ignoring {model_dir}: {e}")
+    return load_legacy_similarity(legacy_path)
+
+
+def _load_content_model(movies_df, model_dir, featurizer):
+    stale = changed_rows(model_dir, movies_df)
+    if stale is None:
+        # Built without row hashes: the rows the model covers must match exactly,
+        # movies appended since have no neighbors until the next build
+        n_items = read_header(model_dir)["n_items"]
+        return load_model(model_dir, checksum=catalog_checksum(movies_df.iloc[:n_items]))
+
+    model = load_model(model_dir)
+    if not len(stale):
+        return model
+    if featurizer is None or not model.supports_updates:
+        # Still far better than the legacy pickle or no model at all
+        print(f"⚠️ {len(stale)} catalog movies changed since the {model.kind} model was built; "
+              f"they keep their old neighbors (none if new) until build_model.py content is rerun")
+        return model
+    if len(stale) > MAX_CATCH_UP_ROWS:
+        raise ValueError(f"{len(stale)} catalog movies changed since the model was built; "
+                         f"rerun build_model.py content")
+    for row in stale:
+        movie = movies_df.iloc[row]
+        features = featurizer.transform_one(_text(movie.get('overview')), _text(movie.get('genres')))
+        model = model.set_item(int(row), features)
+    print(f"🩹 Patched {len(stale)} movies added or edited since the model was built")
+    return model
+
+
+def _text(value):
+    return "" if pd.isna(value) else str(value)
+
+
+def load_cf_model(movies_df, cf_model_dir):
+    """Item-item collaborative filtering model built by `build_model.py cf`, or None.
+
+    Movies appended to the catalog after the build are fine (they have no CF
+    neighbors yet); the rows the model covers must still match.
+    """
+    if not model_exists(cf_model_dir):
+        return None
+    try:
+        n_items = read_header(cf_model_dir)["n_items"]
+        return load_model(cf_model_dir, checksum=catalog_checksum(movies_df.iloc[:n_items]))
+    except ValueError as e:
+        print(f"⚠️ Ignoring {cf_model_dir}: {e}")
+        return None
+
+
+def load_popularity(cf_model_dir):
+    """Per-movie like counts saved with the CF model (empty if it was never built)"""
+    counts = load_extra(cf_model_dir, POPULARITY_FILE) if model_exists(cf_model_dir) else None
+    return np.asarray(counts or [], dtype=np.int64)
+
+
+def load_featurizer(model_dir):
+    """Featurizer saved with the model, needed to add movies without a rebuild"""
+    data = load_extra(model_dir, FEATURIZER_FILE) if model_exists(model_dir) else None
+    return ContentFeaturizer.from_dict(data) if data else None
+
+
+def load_snapshot(catalog_path, model_dir, cf_model_dir, legacy_path, strict=True):
+    """Load catalog and models from disk into a new snapshot.
+
+    With `strict`, a model that cannot be loaded or does not match the
+    catalog raises (used for hot swaps, which keep the old snapshot on
+    failure). Otherwise an empty neighbor index stands in (used at startup).
+    """
+    movies_df = pd.read_csv(catalog_path)
+    featurizer = load_featurizer(model_dir)
+    try:
+        similarity_model = load_similarity_model(movies_df, model_dir, legacy_path, featurizer)
+    except Exception:
+        if strict:
+            raise
+        print("⚠️ Could not load similarity model, using an empty neighbor index...")
+        similarity_model = NeighborIndex.empty(len(movies_df))
+
+    snapshot = ServingSnapshot(
+        movies_df,
+        similarity_model,
+        cf_model=load_cf_model(movies_df, cf_model_dir),
+        featurizer=featurizer,
+        popularity=load_popularity(cf_model_dir),
+        source=_source_signature(catalog_path, model_dir, cf_model_dir, legacy_path),
+    )
+    if strict:
+        snapshot.validate()
+    return snapshot
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _source_signature(catalog_path, model_dir, cf_model_dir, legacy_path):
+    """Modification times of the files a snapshot was loaded from"""
+    return {
+        "catalog": _mtime(catalog_path),
+        "model": _mtime(os.path.join(model_dir, HEADER_FILE)),
+        "cf_model": _mtime(os.path.join(cf_model_dir, HEADER_FILE)),
+        "legacy": _mtime(legacy_path),
+    }
+
+
+class SnapshotManager:
+    """Holds the current snapshot and swaps in new ones atomically.
+
+    Swapping is a single reference assignment under a lock; readers never
+    take the lock. Up to `history` previous snapshots are kept for rollback.
+    """
+
+    def __init__(self, snapshot, paths, history=3):
+        self._current = snapshot
+        self.paths = paths
+        self._history = deque(maxlen=history)
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self.last_reload = {"status": None, "error": None, "finished_at": None}
+        self._watcher = None
+
+    @property
+    def current(self):
+        return self._current
+
+    @property
+    def lock(self):
+        """Held while deriving and publishing a snapshot from the current one"""
+        return self._lock
+
+    def signature(self):
+        """Modification times of the catalog and model files as they are now"""
+        return _source_signature(**self.paths)
+
+    def swap(self, snapshot, keep_history=True):
+        """Publish `snapshot`; the replaced one is kept for rollback when `keep_history`"""
+        with self._lock:
+            if keep_history:
+                self._history.append(self._current)
+            self._current = snapshot
+        return snapshot
+
+    def rollback(self):
+        """Swap the previous snapshot back in; returns it, or None if there is none"""
+        with self._lock:
+            if not self._history:
+                return None
+            self._current = self._history.pop()
+            return self._current
+
+    def history(self):
+        with self._lock:
+            return [snapshot.describe() for snapshot in self._history]
+
+    def reload(self):
+        """Load catalog and models from disk and swap them in; the old snapshot stays on failure"""
+        with self._reload_lock:
+            try:
+                snapshot = load_snapshot(**self.paths)
+            except Exception as e:
+                self.last_reload = {"status": "failed", "error": str(e),
+                                    "finished_at": datetime.now().isoformat(timespec="seconds")}
+                print(f"⚠️ Model reload failed, keeping version {self._current.version}: {e}")
+                return None
+            self.swap(snapshot)
+            self.last_reload = {"status": "loaded", "error": None, "finished_at": snapshot.loaded_at}
+            print(f"✅ Swapped in model version {snapshot.version}: {snapshot.similarity_model.kind} "
+                  f"{snapshot.similarity_model.shape}")
+            return snapshot
+
+    def reload_async(self):
+        """Start `reload` in a background thread; False if one is already running"""
+        if self._reload_lock.locked():
+            return False
+        threading.Thread(target=self.reload, daemon=True).start()
+        return True
+
+    def watch(self, interval):
+        """Poll the model and catalog files every `interval` seconds and reload when they change"""
+        if self._watcher is not None:
+            return
+
+        def run():
+            seen = self._current.source
+            while True:
+                time.sleep(interval)
+                signature = self.signature()
+                # Reload once per change (not again after a failed load or a rollback),
+                # and not for a catalog this process wrote itself
+                if signature != seen:
+                    seen = signature
+                    if signature != self._current.source:
+                        self.reload()
+
+        self._watcher = threading.Thread(target=run, daemon=True)
+        self._watcher.start()
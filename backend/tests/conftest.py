@@ -0,0 +1,31 @@
+"""Shared fixtures. Backend modules are imported flat (as main.py does), so backend/ goes on sys.path."""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ["space", "love", "war", "heist", "ghost", "robot", "family", "river", "king", "detective",
+         "ocean", "island", "dragon", "prison", "music", "school", "desert", "storm", "secret", "city"]
+GENRES = ["Action", "Drama", "Comedy", "Sci-Fi", "Horror", "Romance"]
+
+
+def make_catalog(n, seed=0):
+    """Synthetic catalog with distinct overviews, so similarities have no ties"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "title": [f"Movie {i}" for i in range(n)],
+        "movie_id": np.arange(1000, 1000 + n),
+        "genres": ["|".join(rng.choice(GENRES, size=2, replace=False)) for _ in range(n)],
+        "rating": np.round(rng.uniform(5, 9, size=n), 1),
+        "overview": [" ".join(rng.choice(WORDS, size=8)) + f" m{i}" for i in range(n)],
+    })
+
+
+@pytest.fixture
+def catalog():
+    return make_catalog(60)
@@ -0,0 +1,27 @@
+from cache import ResultCache
+
+
+def test_requests_on_an_old_version_do_not_flush_the_current_one():
+    current = {"version": 2}
+    cache = ResultCache(current_version=lambda: current["version"])
+    cache.put("a", 2, "ranking a")
+    # A request that started before the swap finishes late
+    cache.put("b", 1, "stale ranking")
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 2) == "ranking a"
+    assert cache.stats()["invalidations"] == 0
+
+    # Rolling back makes version 1 current again
+    current["version"] = 1
+    assert cache.get("a", 2) is None
+    cache.put("b", 1, "ranking b")
+    assert cache.get("b", 1) == "ranking b"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_without_a_current_version_the_highest_seen_wins():
+    cache = ResultCache()
+    cache.put("a", 2, "ranking a")
+    cache.put("b", 1, "stale ranking")
+    assert cache.get("a", 2) == "ranking a"
+    assert cache.get("b", 1) is None
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from catalog import CatalogIndex
+
+
+def make_index():
+    return CatalogIndex.from_dataframe(pd.DataFrame({
+        "title": ["The Dark Knight", "Inception", "Interstellar", "The Dark Knight Rises", "Amélie"],
+        "movie_id": [155, 27205, 157336, 49026, None],
+        "genres": ["Action|Crime", "Action|Sci-Fi", "Sci-Fi|Drama", "Action|Crime", None],
+        "rating": [9.0, 8.8, 8.6, 8.4, 8.3],
+    }))
+
+
+def test_suggest_prefers_substring_matches_in_catalog_order():
+    assert make_index().suggest("dark knight") == ["The Dark Knight", "The Dark Knight Rises"]
+
+
+def test_suggest_finds_misspelled_titles():
+    index = make_index()
+    assert index.suggest("Inceptoin")[0] == "Inception"
+    assert index.suggest("amelie") == ["Amélie"]
+    assert index.suggest("zzz") == []
+
+
+def test_genre_masks_parse_shared_and_missing_genres():
+    index = make_index()
+    np.testing.assert_array_equal(index.filter_mask(("Crime",)), [True, False, False, True, False])
+    np.testing.assert_array_equal(index.filter_mask(("Sci-Fi",), min_rating=8.7), [False, True, False, False, False])
@@ -0,0 +1,49 @@
+import threading
+import time
+
+from posters import FOUND, PosterCache, PosterResolver
+
+
+def test_prefetch_queues_each_movie_once_and_skips_cached_ones(tmp_path):
+    cache = PosterCache(str(tmp_path / "posters.db"))
+    release = threading.Event()
+    fetched = []
+
+    def fetch(movie_id):
+        release.wait(5)
+        fetched.append(movie_id)
+        return f"/p{movie_id}.jpg", FOUND
+
+    resolver = PosterResolver(cache, fetch, max_workers=4, prefetch_workers=1)
+    for _ in range(10):
+        resolver.prefetch([1, 2, 3])
+    assert resolver.stats()["prefetch_pending"] == 3
+
+    # Cached by someone else while still queued behind movie 1
+    cache.put(3, "/p3.jpg", FOUND)
+    release.set()
+    deadline = time.time() + 5
+    while resolver.stats()["prefetch_pending"] and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert sorted(fetched) == [1, 2]
+    assert set(resolver.cached([1, 2, 3])) == {1, 2, 3}
+
+
+def test_requests_do_not_wait_behind_prefetches(tmp_path):
+    cache = PosterCache(str(tmp_path / "posters.db"))
+    release = threading.Event()
+
+    def fetch(movie_id):
+        if movie_id < 100:
+            release.wait(5)
+        return f"/p{movie_id}.jpg", FOUND
+
+    resolver = PosterResolver(cache, fetch, max_workers=2, prefetch_workers=1, max_pending=5)
+    resolver.prefetch(range(50))
+    assert resolver.stats()["prefetch_pending"] == 5
+
+    started = time.perf_counter()
+    assert len(resolver.resolve_many([101, 102])) == 2
+    assert time.perf_counter() - started < 1
+    release.set()
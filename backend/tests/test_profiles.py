@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+
+from build_model import content_neighbors
+from features import ContentFeaturizer
+from profiles import ProfileCache, UserProfile
+
+
+def build_model(catalog):
+    features = ContentFeaturizer.fit(catalog).transform(catalog)
+    index = content_neighbors(features, 10, workers=1)
+    index.features = features
+    return index
+
+
+def test_like_recorded_while_the_profile_loads_is_kept(catalog):
+    model = build_model(catalog)
+    cache = ProfileCache()
+
+    def load_liked_rows():
+        # The database was read; a like commits (and is recorded) before the build finishes
+        cache.record_like(1, 9, model)
+        return [3, 5]
+
+    profile = cache.get(1, model, load_liked_rows)
+    assert profile.liked_rows == {3, 5, 9}
+    assert cache.get(1, model, lambda: []) is profile
+
+    expected = UserProfile(model)
+    expected.add([3, 5, 9])
+    np.testing.assert_allclose(profile.recommend(10)[1], expected.recommend(10)[1], rtol=1e-6)
+
+
+class SlowModel:
+    """Model whose neighbor lookups wait for `release`"""
+
+    def __init__(self, model):
+        self.model = model
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def neighbors(self, idx, k, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+        return self.model.neighbors(idx, k, **kwargs)
+
+
+def test_folding_in_a_like_does_not_block_other_users(catalog):
+    model = SlowModel(build_model(catalog))
+    cache = ProfileCache()
+    model.release.set()
+    cache.get(1, model, lambda: [3])
+    cache.get(2, model, lambda: [4])
+    model.release.clear()
+    model.started.clear()
+
+    worker = threading.Thread(target=cache.record_like, args=(1, 8, model))
+    worker.start()
+    assert model.started.wait(5)
+    # User 1's like is still being folded in; user 2's cached profile is served meanwhile
+    lookup = threading.Thread(target=cache.get, args=(2, model, lambda: []))
+    lookup.start()
+    lookup.join(1)
+    finished_while_blocked = not lookup.is_alive()
+    model.release.set()
+    worker.join(5)
+    lookup.join(5)
+
+    assert finished_while_blocked
+    assert cache.get(1, model, lambda: []).liked_rows == {3, 8}
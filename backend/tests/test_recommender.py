@@ -0,0 +1,131 @@
+import numpy as np
+
+from ann import IVFIndex, benchmark_recall
+from build_model import content_neighbors
+from features import ContentFeaturizer
+from recommender import EmbeddingModel, top_k
+
+
+def build_index(features, k):
+    index = content_neighbors(features, k, workers=1)
+    index.features = features
+    return index
+
+
+def test_set_item_matches_full_rebuild(catalog):
+    featurizer = ContentFeaturizer.fit(catalog)
+    features = featurizer.transform(catalog)
+    n, k = len(catalog), 10
+
+    base = build_index(features[:n - 1], k)
+    patched = base.set_item(n - 1, features[n - 1].toarray().ravel())
+    rebuilt = build_index(features, k)
+
+    assert base.n_items == n - 1
+    assert patched.n_items == n
+    for row in range(n):
+        patched_indices, patched_scores = patched.row_list(row)
+        rebuilt_indices, rebuilt_scores = rebuilt.row_list(row)
+        np.testing.assert_allclose(patched_scores, rebuilt_scores, rtol=1e-5, atol=1e-6)
+        np.testing.assert_array_equal(patched_indices, rebuilt_indices)
+
+
+def test_parallel_build_matches_single_process(catalog):
+    features = ContentFeaturizer.fit(catalog).transform(catalog)
+    serial = content_neighbors(features, 10, workers=1)
+    # A tiny memory budget forces many blocks, spread over worker processes
+    parallel = content_neighbors(features, 10, workers=2, memory_mb=0.001)
+
+    np.testing.assert_allclose(np.asarray(parallel.scores), np.asarray(serial.scores), rtol=1e-5, atol=1e-6)
+
+
+def test_filtered_candidates_only_rescan_when_too_few_results(catalog):
+    features = ContentFeaturizer.fit(catalog).transform(catalog)
+    index = build_index(features, 10)
+    allowed = np.zeros(len(catalog), dtype=bool)
+    allowed[::2] = True
+    stored, _ = index.row_list(1)
+    surviving = stored[allowed[stored]]
+
+    # Asking for many extra candidates but needing only 2 keeps the filtered stored list
+    indices, _ = index.neighbors(1, 30, allowed=allowed, min_results=2)
+    np.testing.assert_array_equal(indices, surviving)
+
+    # Needing all 30 rescores the catalog
+    indices, _ = index.neighbors(1, 30, allowed=allowed)
+    assert len(indices) == 30 and allowed[indices].all()
+
+
+def test_pairwise_reads_stored_and_patched_lists(catalog):
+    features = ContentFeaturizer.fit(catalog).transform(catalog)
+    n = len(catalog)
+    index = build_index(features[:n - 1], 10).set_item(n - 1, features[n - 1].toarray().ravel())
+    rows = np.array([n - 1, 3, 0, 17, 42, 8, 25])
+
+    expected = np.zeros((len(rows), len(rows)), dtype=np.float32)
+    for i, row in enumerate(rows):
+        for j, other in enumerate(rows):
+            indices, scores = index.row_list(row)
+            if other in indices:
+                expected[i, j] = max(expected[i, j], scores[list(indices).index(other)])
+                expected[j, i] = max(expected[j, i], expected[i, j])
+
+    np.testing.assert_allclose(index.pairwise(rows), expected)
+
+
+def test_top_k_matches_a_full_sort():
+    rng = np.random.default_rng(0)
+    # Distinct scores: among ties the partial sort may pick any of the tied rows
+    scores = rng.permutation(500).astype(np.float64)
+    allowed = rng.random(500) < 0.7
+    exclude = [3, 10, 499]
+
+    valid = allowed.copy()
+    valid[exclude] = False
+    expected = [i for i in np.argsort(-scores, kind="stable") if valid[i]]
+
+    np.testing.assert_array_equal(top_k(scores, 20), np.argsort(-scores, kind="stable")[:20])
+    np.testing.assert_array_equal(top_k(scores, 20, offset=15, exclude=exclude, allowed=allowed), expected[15:35])
+    # Asking past the end returns what is left; a short mask counts as not allowed
+    np.testing.assert_array_equal(top_k(scores, 50, offset=len(expected) - 5, exclude=exclude, allowed=allowed),
+                                  expected[-5:])
+    assert len(top_k(scores, 10, allowed=np.ones(100, dtype=bool))) == 10
+    assert top_k(scores, 10, allowed=np.ones(100, dtype=bool)).max() < 100
+
+
+def test_ivf_recall_grows_with_probes():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(16, 32))
+    vectors = centers[rng.integers(0, 16, size=3000)] + 0.3 * rng.normal(size=(3000, 32))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    model = EmbeddingModel(vectors, exact_below=0)
+    model.ann = IVFIndex.build(model, n_lists=16)
+
+    assert np.diff(model.ann.indptr).sum() == len(vectors)
+    np.testing.assert_array_equal(np.sort(model.ann.items), np.arange(len(vectors)))
+
+    report = {row["n_probe"]: row["recall"] for row in benchmark_recall(model, n_queries=100, n_probes=(1, 4, 16))}
+    assert report[1] <= report[4] <= report[16]
+    assert report[4] >= 0.9
+    # Probing every list is exact search
+    assert report[16] == 1.0
+
+
+def test_refeaturized_movie_is_rescored_in_every_list_holding_it(catalog):
+    features = ContentFeaturizer.fit(catalog).transform(catalog)
+    index = build_index(features, 10)
+    row, vector = 7, features[30].toarray().ravel()
+    holders_before = [other for other in range(len(catalog)) if row in index.row_list(other)[0]]
+
+    # Twice, so the second edit also has to rescore the patched (in-memory) lists
+    patched = index.set_item(row, features[12].toarray().ravel()).set_item(row, vector)
+    similarities = patched.similarities(vector)
+
+    holders = 0
+    for other in range(len(catalog)):
+        indices, scores = patched.row_list(other)
+        assert (np.diff(scores) <= 1e-6).all()
+        if row in indices:
+            holders += 1
+            assert np.isclose(scores[list(indices).index(row)], similarities[other], atol=1e-6)
+    assert holders and holders_before
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from build_model import content_neighbors
+from conftest import make_catalog
+from features import FEATURIZER_FILE, ContentFeaturizer, prepare_catalog
+from model_store import catalog_checksum, changed_rows, row_hashes, save_model
+from serving import load_snapshot
+
+
+def build_content_model(movies_df, directory, featurizer, k=10):
+    """What `build_model.py content` writes, without the CLI"""
+    movies_df = prepare_catalog(movies_df)
+    features = featurizer.transform(movies_df)
+    index = content_neighbors(features, k, workers=1)
+    index.features = features
+    save_model(index, directory, catalog_checksum(movies_df),
+               extras={FEATURIZER_FILE: featurizer.to_dict()}, hashes=row_hashes(movies_df))
+    return index
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {
+        "catalog_path": str(tmp_path / "movies.csv"),
+        "model_dir": str(tmp_path / "recommender"),
+        "cf_model_dir": str(tmp_path / "cf"),
+        "legacy_path": str(tmp_path / "similarity.pkl"),
+    }
+
+
+def test_movies_added_after_the_build_are_caught_up_on_load(paths, tmp_path):
+    movies_df = make_catalog(40)
+    featurizer = ContentFeaturizer.fit(movies_df)
+    build_content_model(movies_df.iloc[:37], paths["model_dir"], featurizer)
+
+    # Admin edits: three movies appended and one re-described
+    movies_df.loc[5, "overview"] = "dragon storm secret dragon ocean island prison"
+    movies_df.to_csv(paths["catalog_path"], index=False)
+    np.testing.assert_array_equal(changed_rows(paths["model_dir"], pd.read_csv(paths["catalog_path"])),
+                                  [5, 37, 38, 39])
+
+    snapshot = load_snapshot(**paths)
+    rebuilt = build_content_model(movies_df, str(tmp_path / "rebuilt"), featurizer)
+
+    model = snapshot.similarity_model
+    assert model.n_items == len(movies_df)
+    for row in (5, 37, 38, 39):
+        # Compare scores: equal-scored neighbors may come back in either order
+        np.testing.assert_allclose(model.row_list(row)[1], rebuilt.row_list(row)[1], rtol=1e-5)
+
+
+def test_model_with_unknown_rows_is_rejected(paths):
+    movies_df = make_catalog(40)
+    build_content_model(movies_df, paths["model_dir"], ContentFeaturizer.fit(movies_df))
+    movies_df.iloc[:30].to_csv(paths["catalog_path"], index=False)
+
+    with pytest.raises(ValueError):
+        changed_rows(paths["model_dir"], pd.read_csv(paths["catalog_path"]))
+    with pytest.raises(Exception):
+        load_snapshot(**paths)
+
+
+@pytest.mark.parametrize("with_hashes", [True, False])
+def test_models_that_cannot_be_patched_survive_admin_adds(paths, with_hashes):
+    """`build_model.py neighbors`/`export` output has no features to patch in new movies"""
+    movies_df = make_catalog(40)
+    built = prepare_catalog(movies_df.iloc[:37])
+    index = content_neighbors(ContentFeaturizer.fit(built).transform(built), 10, workers=1)
+    save_model(index, paths["model_dir"], catalog_checksum(built),
+               hashes=row_hashes(built) if with_hashes else None)
+    movies_df.to_csv(paths["catalog_path"], index=False)
+
+    model = load_snapshot(**paths).similarity_model
+    assert model.n_items == 37
+    np.testing.assert_array_equal(model.row_list(3)[0], index.row_list(3)[0])
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from posters import ERROR, FOUND, MISSING, UNAVAILABLE
+from tmdb import CircuitBreaker, TMDBClient
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Local TMDB: odd movie ids have a poster, even ids do not; `fail` answers 500"""
+
+    delay = 0.0
+    fail = False
+    calls = 0
+
+    def do_GET(self):
+        type(self).calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            self.send_response(500)
+            self.end_headers()
+            return
+        movie_id = int(self.path.split("?")[0].rsplit("/", 1)[-1])
+        body = json.dumps({"poster_path": f"/p{movie_id}.jpg"} if movie_id % 2 else {}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tmdb():
+    handler = type("Handler", (StandIn,), {})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/3", handler
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_lookups_of_one_movie_share_a_call(tmdb):
+    base_url, server = tmdb
+    server.delay = 0.3
+    client = TMDBClient("key", base_url=base_url)
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(client.poster, [7] * 10))
+
+    assert server.calls == 1
+    assert client.coalesced == 9
+    assert set(results) == {("https://image.tmdb.org/t/p/w500/p7.jpg", FOUND)}
+    assert client.poster(8) == (None, MISSING)
+    assert server.calls == 2
+
+
+def test_breaker_opens_then_lets_one_trial_through(tmdb):
+    base_url, server = tmdb
+    server.fail = True
+    client = TMDBClient("key", base_url=base_url, failure_threshold=3, reset_seconds=0.2)
+
+    assert [client.poster(i)[1] for i in range(5)] == [ERROR] * 3 + [UNAVAILABLE] * 2
+    assert server.calls == 3
+    assert client.breaker.state == "open"
+
+    # Half-open: the trial fails and the circuit opens again
+    time.sleep(0.25)
+    assert client.poster(11) == (None, ERROR)
+    assert client.breaker.state == "open"
+    assert client.poster(13)[1] == UNAVAILABLE
+
+    # The next trial succeeds and closes it
+    server.fail = False
+    time.sleep(0.25)
+    assert client.poster(15)[1] == FOUND
+    assert client.breaker.state == "closed"
+    assert client.poster(16) == (None, MISSING)
+    assert client.breaker.stats()["times_opened"] == 2
+
+
+def test_only_the_trial_call_ends_the_half_open_state():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    assert breaker.allow() is True
+    # A second call goes out while the circuit is still closed
+    assert breaker.allow() is True
+    breaker.record(False)
+    assert breaker.state == "open"
+
+    assert breaker.allow() == "trial"
+    assert breaker.allow() is False
+    # The slow call from before the circuit opened finishes during the trial
+    breaker.record(True)
+    assert breaker.state == "half_open"
+    assert breaker.allow() is False
+
+    breaker.record(True, trial=True)
+    assert breaker.state == "closed"
+    assert breaker.allow() is True
@@ -0,0 +1,173 @@
+"""TMDB API client shared by every request thread"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from posters import ERROR, FOUND, MISSING, UNAVAILABLE
+
+DEFAULT_BASE_URL = "https://api.themoviedb.org/3"
+IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
+
+
+class CircuitBreaker:
+    """Fails fast after `failure_threshold` consecutive failures.
+
+    The circuit then stays open for `reset_seconds`, after which one trial
+    call is let through (half-open): success closes the circuit, failure
+    opens it again. Results of calls that went out while the circuit was
+    still closed do not count once it has opened; only the trial decides.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now: True, False, or "trial" for the half-open trial call"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return "trial"
+            self.rejected += 1
+            return False
+
+    def record(self, success, trial=False):
+        """Outcome of a call let through by `allow`; pass `trial=True` for the trial call"""
+        with self._lock:
+            if trial:
+                self._trial_running = False
+            elif self.state != "closed":
+                return
+            if success:
+                self.state = "closed"
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected,
+            }
+
+
+class _Call:
+    """Result of one in-flight lookup, shared with every caller that asked for the same movie"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = (None, ERROR)
+
+
+class TMDBClient:
+    """Poster lookups over one keep-alive connection pool.
+
+    At most `max_concurrency` calls are in flight at once across all
+    threads; further callers wait for a free slot. Concurrent lookups of the
+    same movie share one call (singleflight). While the circuit breaker is
+    open, lookups return UNAVAILABLE at once instead of waiting for a
+    timeout. `base_url` can point at a local stand-in for TMDB.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, timeout=5, max_concurrency=8,
+                 failure_threshold=5, reset_seconds=30):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.calls = 0
+        self.coalesced = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def poster(self, movie_id):
+        """(url, status) of a movie's poster; status is FOUND, MISSING, ERROR or UNAVAILABLE"""
+        with self._inflight_lock:
+            call = self._inflight.get(movie_id)
+            leader = call is None
+            if leader:
+                call = self._inflight[movie_id] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            return call.result
+
+        try:
+            call.result = self._fetch_poster(movie_id)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[movie_id]
+            call.done.set()
+        return call.result
+
+    def _fetch_poster(self, movie_id):
+        allowed = self.breaker.allow()
+        if not allowed:
+            return None, UNAVAILABLE
+        result = self._request_poster(movie_id)
+        self.breaker.record(result[1] != ERROR, trial=allowed == "trial")
+        return result
+
+    def _request_poster(self, movie_id):
+        try:
+            with self._slots:
+                self.calls += 1
+                response = self.session.get(f"{self.base_url}/movie/{movie_id}",
+                                            params={"api_key": self.api_key}, timeout=self.timeout)
+
+            if response.status_code == 200:
+                poster_path = response.json().get('poster_path')
+                if poster_path:
+                    return f"{IMAGE_BASE_URL}{poster_path}", FOUND
+                return None, MISSING
+            if response.status_code == 404:
+                return None, MISSING
+
+            print(f"TMDB API error: HTTP {response.status_code} for movie {movie_id}")
+            return None, ERROR
+
+        except Exception as e:
+            print(f"TMDB API error: {e}")
+            return None, ERROR
+
+    def stats(self):
+        with self._inflight_lock:
+            in_flight = len(self._inflight)
+        return {
+            "base_url": self.base_url,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+            "max_concurrency": self.max_concurrency,
+            "circuit": self.breaker.stats(),
+        }